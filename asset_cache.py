@@ -0,0 +1,55 @@
+import sqlite3
+from typing import Optional
+
+
+class AssetCache:
+    """
+    Persistent record of the images already uploaded to Prismic.
+
+    Assets are keyed by the SHA-256 of their content, and every source URL
+    seen so far points at one of those hashes, so an image is only uploaded
+    once no matter how many posts, URLs or runs reference it.
+
+    :param path: SQLite database file; created on first use.
+    """
+
+    def __init__(self, path: str = 'asset_cache.sqlite3'):
+        self.path = path
+        # Shards of a migration share this file; wait for each other's writes rather than failing
+        self.conn = sqlite3.connect(path, timeout=30.0)
+        # WAL lets several migrator processes read the cache while one writes
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS assets (
+                sha256 TEXT PRIMARY KEY,
+                asset_id TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sources (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL
+            );
+        ''')
+        self.conn.commit()
+
+    def get_by_url(self, url: str) -> Optional[str]:
+        """Return the asset ID for a source URL that was already uploaded, if any."""
+        row = self.conn.execute(
+            'SELECT assets.asset_id FROM sources JOIN assets USING (sha256) WHERE sources.url = ?',
+            (url,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_by_hash(self, sha256: str) -> Optional[str]:
+        """Return the asset ID for content that was already uploaded, if any."""
+        row = self.conn.execute('SELECT asset_id FROM assets WHERE sha256 = ?', (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, url: str, sha256: str, asset_id: str = None) -> None:
+        """Remember that `url` serves the content `sha256`, and optionally its new asset ID."""
+        with self.conn:
+            if asset_id:
+                self.conn.execute('INSERT OR REPLACE INTO assets (sha256, asset_id) VALUES (?, ?)', (sha256, asset_id))
+            self.conn.execute('INSERT OR REPLACE INTO sources (url, sha256) VALUES (?, ?)', (url, sha256))
+
+    def close(self) -> None:
+        self.conn.close()
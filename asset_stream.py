@@ -0,0 +1,118 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import uuid
+from email.message import Message
+from typing import IO, AsyncIterator, Dict, Tuple
+from urllib.parse import unquote, urlparse
+
+import httpx
+
+# Bytes read from the network or disk at a time; the most any one transfer holds in memory
+CHUNK_SIZE = 64 * 1024
+
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+async def spool_download(response: httpx.Response) -> Tuple[IO[bytes], str, int]:
+    """
+    Copy a streamed response body to a temporary file, hashing it on the way.
+
+    The file is rewound and returned with the body's sha256 and size; it is
+    deleted as soon as it is closed. It has a name, so worker processes
+    (see image_optimizer.py) can open it too.
+    """
+    spool = tempfile.NamedTemporaryFile()
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            sha256.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, sha256.hexdigest(), size
+
+
+def asset_content_type(response: httpx.Response, filename: str) -> str:
+    """The MIME type the server declared, falling back to a guess from the file name."""
+    content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type and content_type != DEFAULT_CONTENT_TYPE:
+        return content_type
+    return mimetypes.guess_type(filename)[0] or DEFAULT_CONTENT_TYPE
+
+
+def asset_filename(url: str, response: httpx.Response) -> str:
+    """
+    The file name of a downloaded asset.
+
+    Taken from the Content-Disposition header when there is one, from the
+    URL path otherwise, and given an extension matching its MIME type if it
+    has none (e.g. images served by a PHP script).
+    """
+    filename = ''
+    disposition = response.headers.get('content-disposition')
+    if disposition:
+        message = Message()
+        message['content-disposition'] = disposition
+        filename = message.get_filename() or ''
+    if not filename:
+        filename = unquote(urlparse(url).path.rstrip('/').rsplit('/', 1)[-1])
+    # Never let a header smuggle a path or a quote into the multipart headers
+    filename = re.sub(r'[\\/"\r\n]', '_', os.path.basename(filename)) or 'asset'
+
+    if not os.path.splitext(filename)[1]:
+        content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+        extension = mimetypes.guess_extension(content_type) if content_type else None
+        if extension:
+            filename += extension
+    return filename
+
+
+class MultipartFileStream:
+    """
+    A multipart/form-data body holding a single file, streamed from disk.
+
+    Unlike an async generator it can be iterated more than once, rewinding
+    the file each time, so a request retried after a 429 sends the whole
+    body again.
+
+    :param file: Binary file positioned anywhere; read from the start.
+    :param size: Size of the file in bytes, for the Content-Length header.
+    :param filename: Name sent for the file part.
+    :param content_type: MIME type sent for the file part.
+    :param field: Name of the form field.
+    """
+
+    def __init__(self, file: IO[bytes], size: int, filename: str, content_type: str, field: str = 'file'):
+        self.file = file
+        self.boundary = uuid.uuid4().hex
+        self.head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode()
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self.size = size
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            'Content-Type': f'multipart/form-data; boundary={self.boundary}',
+            'Content-Length': str(len(self.head) + self.size + len(self.tail)),
+        }
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        self.file.seek(0)
+        yield self.head
+        while True:
+            chunk = self.file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        yield self.tail
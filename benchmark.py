@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from generate_wxr import Corpus, WxrGenerator
+from migrate import WordPressToPrismicMigrator
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def peak_rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class InstrumentedMigrator(WordPressToPrismicMigrator):
+    """Records the latency of every HTTP request, up to the response headers."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        client = super().client_for(url)
+        if not getattr(client, 'instrumented', False):
+            client.event_hooks['request'].append(self._on_request)
+            client.event_hooks['response'].append(self._on_response)
+            client.instrumented = True
+        return client
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        request.extensions['benchmark_start'] = time.perf_counter()
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        start = response.request.extensions.get('benchmark_start')
+        if start is not None:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def start_fake_server(args: argparse.Namespace) -> tuple:
+    """Run fake_prismic.py in its own process, so its memory doesn't count towards the migrator's."""
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_prismic.py'),
+            '--port', '0',
+            '--latency', str(args.latency),
+            '--failure-rate', str(args.failure_rate),
+            '--migration-rps', str(args.server_migration_rps),
+            '--asset-rps', str(args.server_asset_rps),
+            '--cdn-rps', str(args.server_cdn_rps),
+            '--media-size', str(args.media_size),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    base_url = server.stdout.readline().strip().rsplit(' ', 1)[-1]
+    return server, base_url
+
+
+async def run_benchmark(args: argparse.Namespace, xml_path: str, workdir: str, base_url: str) -> Dict[str, Any]:
+    os.environ['PRISMIC_MIGRATION_URL'] = f'{base_url}/documents'
+    os.environ['PRISMIC_ASSET_URL'] = f'{base_url}/assets'
+    os.environ['PRISMIC_API_URL'] = f'{base_url}/api/v2'
+
+    migrator = InstrumentedMigrator(
+        max_in_flight=args.max_in_flight,
+        rates={'migration': args.rate, 'asset': args.rate, 'cdn': args.rate},
+        asset_cache_path=os.path.join(workdir, 'asset_cache.sqlite3'),
+        uid_index_path=os.path.join(workdir, 'uid_index.json'),
+        journal_path=os.path.join(workdir, 'migration_journal.jsonl'),
+        fingerprints_path=os.path.join(workdir, 'post_fingerprints.sqlite3'),
+        dead_letter_path=os.path.join(workdir, 'dead_letters.jsonl'),
+        transform_cache_path=os.path.join(workdir, 'transform_cache.sqlite3'),
+        verbose=args.verbose,
+    )
+
+    output = sys.stdout if args.verbose else open(os.devnull, 'w')
+    start = time.perf_counter()
+    async with migrator:
+        with contextlib.redirect_stdout(output):
+            existing_posts = await migrator.get_current_posts()
+            if args.preupload_workers:
+                await migrator.preupload_attachments(xml_path, workers=args.preupload_workers)
+            await migrator.migrate_to_prismic(
+                migrator.iter_wordpress_posts(xml_path),
+                existing_posts,
+                transform_workers=args.transform_workers,
+                upload_workers=args.upload_workers,
+                create_workers=args.create_workers,
+                queue_size=args.queue_size,
+                transform_processes=args.transform_processes,
+                chunk_size=args.chunk_size,
+            )
+    elapsed = time.perf_counter() - start
+
+    stats = httpx.get(f'{base_url}/stats').json()
+    return {
+        'posts': args.posts,
+        'seconds': round(elapsed, 3),
+        'documents': stats.get('documents', 0),
+        'assets': stats.get('assets', 0),
+        'docs_per_sec': round(stats.get('documents', 0) / elapsed, 2),
+        'assets_per_sec': round(stats.get('assets', 0) / elapsed, 2),
+        'peak_rss_mb': round(peak_rss_mb(resource.RUSAGE_SELF), 1),
+        'peak_rss_transform_workers_mb': round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        'requests': len(migrator.latencies),
+        'latency_p50_ms': round(percentile(migrator.latencies, 0.50) * 1000, 2),
+        'latency_p99_ms': round(percentile(migrator.latencies, 0.99) * 1000, 2),
+        'dead_letters': len(migrator.dead_letters.entries()),
+        'stages': migrator.metrics.snapshot()['histograms'],
+        'server': stats,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the migrator end to end against a local fake Prismic.')
+    parser.add_argument('--posts', type=int, default=200, help='Number of posts in the synthetic export')
+    parser.add_argument('--attachments-per-post', type=int, default=2, help='Images attached to each synthetic post')
+    parser.add_argument('--fixture', default='wordpress.xml', help='Export the synthetic content is modelled on')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic export')
+    parser.add_argument('--workdir', help='Keep the export and local stores here instead of a temporary directory')
+    parser.add_argument('--latency', type=float, default=0.02, help='Mean latency the fake server adds per request, in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of API requests the fake server fails')
+    parser.add_argument('--server-migration-rps', type=float, default=0.0, help='Migration API rate before the fake answers 429')
+    parser.add_argument('--server-asset-rps', type=float, default=0.0, help='Asset API rate before the fake answers 429')
+    parser.add_argument('--server-cdn-rps', type=float, default=0.0, help='CDN API rate before the fake answers 429')
+    parser.add_argument('--media-size', type=int, default=50_000, help='Size of each fake image, in bytes')
+    parser.add_argument('--rate', type=float, default=50.0, help="Migrator's initial requests/s per endpoint")
+    parser.add_argument('--max-in-flight', type=int, default=8)
+    parser.add_argument('--transform-workers', type=int, default=None, help='Chunks converted concurrently (default: one per transform process)')
+    parser.add_argument('--transform-processes', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=8)
+    parser.add_argument('--upload-workers', type=int, default=4)
+    parser.add_argument('--preupload-workers', type=int, default=8, help='Attachments uploaded up front (0: as posts reference them)')
+    parser.add_argument('--create-workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=16)
+    parser.add_argument('--verbose', action='store_true', help="Show the migrator's own output")
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args)
+    try:
+        with contextlib.ExitStack() as stack:
+            workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory())
+            os.makedirs(workdir, exist_ok=True)
+            xml_path = os.path.join(workdir, 'export.xml')
+            generator = WxrGenerator(Corpus(args.fixture), site_url='https://example.com',
+                                     media_url=f'{base_url}/media', seed=args.seed)
+            with open(xml_path, 'w', encoding='utf-8') as out:
+                generator.write(out, args.posts, args.posts * args.attachments_per_post)
+            report = asyncio.run(run_benchmark(args, xml_path, workdir, base_url))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Posts:            {report['posts']}")
+    print(f"Elapsed:          {report['seconds']} s")
+    print(f"Documents:        {report['documents']} ({report['docs_per_sec']} docs/s)")
+    print(f"Assets:           {report['assets']} ({report['assets_per_sec']} assets/s)")
+    print(f"Dead letters:     {report['dead_letters']}")
+    print(f"Peak RSS:         {report['peak_rss_mb']} MB (transform workers: {report['peak_rss_transform_workers_mb']} MB)")
+    print(f"Request latency:  p50 {report['latency_p50_ms']} ms, p99 {report['latency_p99_ms']} ms over {report['requests']} requests")
+    for name, histogram in report['stages'].items():
+        print(f"  {name + ':':<38} mean {histogram['mean'] * 1000:.2f} ms, p99 <= {histogram['p99'] * 1000:g} ms ({histogram['count']})")
+    print(f"Server counters:  {json.dumps(report['server'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,55 +3,249 @@ import httpx
 from dotenv import load_dotenv
 import json
 import time
+import asyncio
+import argparse
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Iterable, Tuple
+from migration_journal import read_journal, CREATED, UPDATED
+from retry import RetryPolicy, describe_error, is_retryable
 
 load_dotenv()
 
-def check_migration_status():
+# Documents requested per page of the status endpoint
+STATUS_PAGE_SIZE = 100
+# Pages of the status endpoint requested at the same time
+STATUS_CONCURRENCY = 4
+
+# id -> (uid, type, state): all a snapshot needs to remember to be diffed later
+Snapshot = Dict[str, Tuple[str, str, str]]
+
+
+def document_state(doc: Dict[str, Any]) -> str:
+    """The migration state of a document, as reported by the status endpoint."""
+    return doc.get('status') or ('published' if doc.get('published') else 'draft')
+
+
+def matches(doc: Tuple[str, str, str], types: Iterable[str], states: Iterable[str]) -> bool:
+    _, doc_type, state = doc
+    return (not types or doc_type in types) and (not states or state in states)
+
+
+async def fetch_status_pages(client: httpx.AsyncClient, url: str, headers: Dict[str, str],
+                             page_size: int = STATUS_PAGE_SIZE, concurrency: int = STATUS_CONCURRENCY,
+                             retry_policy: RetryPolicy = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield every document of the migration release, one page at a time.
+
+    When the first page reports `total_pages`, the rest are fetched with up
+    to `concurrency` requests at a time; otherwise pages are requested until
+    a short one comes back. Timeouts, 429s and 5xx are retried with backoff
+    (honouring Retry-After), so one throttled page doesn't fail the snapshot.
+    """
+    retry_policy = retry_policy or RetryPolicy()
+    in_flight = asyncio.Semaphore(concurrency)
+
+    async def fetch(page: int) -> Dict[str, Any]:
+        for attempt in range(retry_policy.max_attempts):
+            try:
+                async with in_flight:
+                    response = await client.get(url, params={'page': page, 'pageSize': page_size}, headers=headers,
+                                                timeout=30.0)
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.HTTPError as e:
+                if not is_retryable(e) or attempt + 1 == retry_policy.max_attempts:
+                    raise
+                delay = retry_policy.delay(attempt)
+                if isinstance(e, httpx.HTTPStatusError):
+                    retry_after = e.response.headers.get('Retry-After', '')
+                    delay = max(delay, float(retry_after)) if retry_after.isdigit() else delay
+                print(f"Retrying page {page} in {delay:.1f} s: {describe_error(e)}")
+                await asyncio.sleep(delay)
+
+    first_page = await fetch(1)
+    for doc in first_page.get('documents', []):
+        yield doc
+
+    total_pages = first_page.get('total_pages')
+    if total_pages:
+        pages = [asyncio.ensure_future(fetch(page)) for page in range(2, total_pages + 1)]
+        try:
+            for page in pages:
+                for doc in (await page).get('documents', []):
+                    yield doc
+        finally:
+            for page in pages:
+                page.cancel()
+        return
+
+    page, size = 1, len(first_page.get('documents', []))
+    while size >= page_size:
+        page += 1
+        documents = (await fetch(page)).get('documents', [])
+        for doc in documents:
+            yield doc
+        size = len(documents)
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """Read a JSONL snapshot written by `take_snapshot`; empty if there is none yet."""
+    snapshot: Snapshot = {}
+    if not os.path.exists(path):
+        return snapshot
+    with open(path) as f:
+        for line in f:
+            try:
+                doc = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            snapshot[doc.get('id', '')] = (doc.get('uid', ''), doc.get('type', ''), document_state(doc))
+    return snapshot
+
+
+async def take_snapshot(client: httpx.AsyncClient, url: str, headers: Dict[str, str], path: str,
+                        concurrency: int = STATUS_CONCURRENCY, retry_policy: RetryPolicy = None) -> Snapshot:
+    """
+    Stream the current status of every document to `path` as JSON lines.
+
+    The file is replaced only once every page was fetched, so a failed poll
+    leaves the previous snapshot in place to diff against.
+    """
+    snapshot: Snapshot = {}
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        async for doc in fetch_status_pages(client, url, headers, concurrency=concurrency, retry_policy=retry_policy):
+            f.write(json.dumps(doc) + '\n')
+            snapshot[doc.get('id', '')] = (doc.get('uid', ''), doc.get('type', ''), document_state(doc))
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> Dict[str, list]:
+    """Documents added, removed, or whose state changed between two snapshots."""
+    return {
+        'added': [(doc_id, new[doc_id]) for doc_id in new.keys() - old.keys()],
+        'removed': [(doc_id, old[doc_id]) for doc_id in old.keys() - new.keys()],
+        'changed': [(doc_id, new[doc_id], old[doc_id][2])
+                    for doc_id in new.keys() & old.keys() if new[doc_id][2] != old[doc_id][2]],
+    }
+
+
+def reconcile(snapshot: Snapshot, journal_path: str) -> Dict[str, list]:
+    """
+    Compare the release with what the migration journal says was sent.
+
+    `missing` were created according to the journal but aren't in the
+    release, `untracked` are in the release but not journaled as created,
+    and `mismatched` are journaled under a different document ID.
+    """
+    sent = {uid: entry.get('document_id', '') for uid, entry in read_journal(journal_path).items()
+            if entry['state'] in (CREATED, UPDATED)}
+    released = {uid: doc_id for doc_id, (uid, _, _) in snapshot.items()}
+
+    return {
+        'missing': sorted(uid for uid in sent.keys() - released.keys()),
+        'untracked': sorted(uid for uid in released.keys() - sent.keys()),
+        'mismatched': sorted((uid, sent[uid], released[uid]) for uid in sent.keys() & released.keys()
+                             if sent[uid] and sent[uid] != released[uid]),
+    }
+
+
+def print_summary(snapshot: Snapshot, types: Iterable[str], states: Iterable[str]) -> None:
+    selected = [doc for doc in snapshot.values() if matches(doc, types, states)]
+    print(f"\nMigration Status: {len(selected)} of {len(snapshot)} documents")
+    print("-" * 50)
+    for (doc_type, state), count in sorted(Counter((doc[1], doc[2]) for doc in selected).items()):
+        print(f"{doc_type:<20} {state:<15} {count}")
+
+
+def print_diff(diff: Dict[str, list], types: Iterable[str], states: Iterable[str], verbose: bool) -> None:
+    added = [(doc_id, doc) for doc_id, doc in diff['added'] if matches(doc, types, states)]
+    removed = [(doc_id, doc) for doc_id, doc in diff['removed'] if matches(doc, types, states)]
+    changed = [(doc_id, doc, old) for doc_id, doc, old in diff['changed'] if matches(doc, types, states)]
+    print(f"{time.strftime('%H:%M:%S')} {len(added)} added, {len(removed)} removed, {len(changed)} changed state")
+    if verbose:
+        for doc_id, (uid, doc_type, state) in added:
+            print(f"  + {doc_type} {uid} ({doc_id}): {state}")
+        for doc_id, (uid, doc_type, state) in removed:
+            print(f"  - {doc_type} {uid} ({doc_id})")
+        for doc_id, (uid, doc_type, state), old_state in changed:
+            print(f"  ~ {doc_type} {uid} ({doc_id}): {old_state} -> {state}")
+
+
+async def check_migration_status(snapshot_path: str = 'migration_status.jsonl', types: Iterable[str] = (),
+                                 states: Iterable[str] = (), watch: float = None, journal_path: str = None,
+                                 verbose: bool = False, concurrency: int = STATUS_CONCURRENCY,
+                                 retry_policy: RetryPolicy = None) -> None:
     repository_name = os.getenv('PRISMIC_REPOSITORY_NAME')
     api_token = os.getenv('PRISMIC_ACCESS_TOKEN')
     api_key = os.getenv('PRISMIC_MIGRATION_API_KEY')
-    
-    # Migration API endpoint
-    migration_url = "https://migration.prismic.io/status"
-    
+
+    # Migration API endpoint; overridable so status can be checked against a local stand-in (see fake_prismic.py)
+    migration_url = os.getenv('PRISMIC_STATUS_URL', "https://migration.prismic.io/status")
+
     headers = {
         'Authorization': f'Bearer {api_token}',
         'repository': repository_name,
         'x-api-key': api_key,
         'Content-Type': 'application/json'
     }
-    
+
+    previous = load_snapshot(snapshot_path)
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                print("\nChecking migration status...")
+                snapshot = await take_snapshot(client, migration_url, headers, snapshot_path, concurrency, retry_policy)
+
+                if watch and previous:
+                    print_diff(diff_snapshots(previous, snapshot), types, states, verbose)
+                else:
+                    print_summary(snapshot, types, states)
+                    if previous:
+                        print_diff(diff_snapshots(previous, snapshot), types, states, verbose)
+                previous = snapshot
+
+                if journal_path:
+                    result = reconcile(snapshot, journal_path)
+                    print(f"Journal: {len(result['missing'])} missing from the release, "
+                          f"{len(result['untracked'])} not journaled, {len(result['mismatched'])} with another ID")
+                    if verbose:
+                        for uid in result['missing']:
+                            print(f"  missing: {uid}")
+                        for uid, journaled_id, released_id in result['mismatched']:
+                            print(f"  mismatched: {uid} (journal {journaled_id}, release {released_id})")
+
+                print(f"Full status details saved to '{snapshot_path}'")
+
+            except Exception as e:
+                print(f"Error checking migration status: {str(e)}")
+
+            if not watch:
+                return
+            await asyncio.sleep(watch)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Check the status of the documents in the Prismic migration release.')
+    parser.add_argument('--snapshot', default='migration_status.jsonl', help='JSONL file the latest status is saved to and diffed against')
+    parser.add_argument('--type', action='append', default=[], help='Only report documents of this custom type (repeatable)')
+    parser.add_argument('--state', action='append', default=[], help='Only report documents in this state, e.g. draft or published (repeatable)')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='Poll every SECONDS and only report what changed')
+    parser.add_argument('--journal', help='Reconcile the release with this migration journal')
+    parser.add_argument('--verbose', action='store_true', help='List every changed, missing or mismatched document')
+    parser.add_argument('--concurrency', type=int, default=STATUS_CONCURRENCY, help='Status pages requested at the same time')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Attempts per page before the snapshot fails; timeouts, 429s and 5xx are retried')
+    args = parser.parse_args()
+
+    if args.journal and not os.path.exists(args.journal):
+        parser.error(f"journal {args.journal} does not exist")
+
     try:
-        print("\nChecking migration status...")
-        response = httpx.get(
-            migration_url,
-            headers=headers,
-            timeout=30.0
-        )
-        response.raise_for_status()
-        
-        status_data = response.json()
-        
-        # Save full response for inspection
-        with open('migration_status.json', 'w') as f:
-            json.dump(status_data, f, indent=2)
-            
-        print("\nMigration Status:")
-        print("-" * 50)
-        print(f"Total documents in migration: {len(status_data.get('documents', []))}")
-        
-        # Print details of each document
-        for doc in status_data.get('documents', []):
-            print("\nDocument:")
-            print(f"ID: {doc.get('id', 'N/A')}")
-            print(f"UID: {doc.get('uid', 'N/A')}")
-            print(f"Type: {doc.get('type', 'N/A')}")
-            print(f"Status: {'Published' if doc.get('published') else 'Draft'}")
-            
-        print("\nFull status details saved to 'migration_status.json'")
-        
-    except Exception as e:
-        print(f"Error checking migration status: {str(e)}")
+        asyncio.run(check_migration_status(args.snapshot, args.type, args.state, args.watch, args.journal, args.verbose,
+                                           args.concurrency, RetryPolicy(args.max_attempts)))
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
-    check_migration_status()
\ No newline at end of file
+    main()
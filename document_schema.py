@@ -0,0 +1,277 @@
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from richtext import utf16_length
+
+# Rich-text block types that hold text, and the span types text can carry
+TEXT_BLOCK_TYPES = {
+    'paragraph', 'preformatted', 'list-item', 'o-list-item',
+    'heading1', 'heading2', 'heading3', 'heading4', 'heading5', 'heading6',
+}
+SPAN_TYPES = {'strong', 'em', 'hyperlink', 'label'}
+EMBED_BLOCK_TYPES = {'image', 'embed'}
+
+# What WordPress slugs are made of, percent-encoded non-ASCII included, and no longer than Prismic allows
+UID_PATTERN = re.compile(r'^[a-z0-9%_.~-]+$')
+MAX_UID_LENGTH = 150
+
+# Top-level fields every Migration API document needs
+REQUIRED_DOCUMENT_FIELDS = ('title', 'type', 'lang', 'data')
+
+
+class CustomType:
+    """
+    A custom type model, as Slice Machine writes it to `customtypes/<id>/index.json`.
+
+    Fields of every tab are flattened into one mapping, which is how they
+    appear in a document's `data`; the UID field lives at the document's top
+    level instead.
+    """
+
+    def __init__(self, model: Dict[str, Any]):
+        self.id = model['id']
+        self.fields: Dict[str, Dict[str, Any]] = {}
+        self.uid_field: Optional[str] = None
+        for tab in model.get('json', {}).values():
+            for name, field in tab.items():
+                if field.get('type') == 'UID':
+                    self.uid_field = name
+                else:
+                    self.fields[name] = field
+
+
+def load_custom_types(directory: str = 'customtypes') -> Dict[str, CustomType]:
+    """Every custom type model under `directory`, by ID."""
+    custom_types = {}
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), '*', 'index.json'))):
+        with open(path) as f:
+            custom_type = CustomType(json.load(f))
+        custom_types[custom_type.id] = custom_type
+    return custom_types
+
+
+def allowed_types(config: Dict[str, Any]) -> Optional[set]:
+    """Block and span types a rich-text field accepts; None when its model doesn't restrict them."""
+    allowed = config.get('single') or config.get('multi')
+    return {kind.strip() for kind in allowed.split(',')} if allowed else None
+
+
+class DocumentValidator:
+    """
+    Checks documents against their custom type models before they are sent.
+
+    Catches locally what the Migration API would reject with a 4xx: unknown
+    types and fields, malformed rich-text blocks and spans, bad UIDs and
+    dates. `validate` returns a list of readable errors, empty when the
+    document is fine.
+
+    :param custom_types: Models by custom type ID (see `load_custom_types`).
+    """
+
+    def __init__(self, custom_types: Dict[str, CustomType]):
+        self.custom_types = custom_types
+
+    def validate(self, doc: Dict[str, Any]) -> List[str]:
+        errors = [f'missing {field}' for field in REQUIRED_DOCUMENT_FIELDS if field not in doc]
+        custom_type = self.custom_types.get(doc.get('type'))
+        if custom_type is None:
+            return errors + [f"unknown custom type {doc.get('type')!r}"]
+
+        if custom_type.uid_field:
+            errors.extend(self.uid_errors(doc.get('uid')))
+        elif 'uid' in doc:
+            errors.append(f'custom type {custom_type.id!r} has no UID')
+
+        data = doc.get('data')
+        if not isinstance(data, dict):
+            return errors + ['data must be an object']
+        for name, value in data.items():
+            field = custom_type.fields.get(name)
+            if field is None:
+                errors.append(f'unknown field {name!r}')
+            else:
+                errors.extend(f'{name}: {error}' for error in self.field_errors(field, value))
+        return errors
+
+    def uid_errors(self, uid: Any) -> List[str]:
+        if not isinstance(uid, str) or not uid:
+            return ['missing uid']
+        errors = []
+        if len(uid) > MAX_UID_LENGTH:
+            errors.append(f'uid is {len(uid)} characters long, at most {MAX_UID_LENGTH} are allowed')
+        if not UID_PATTERN.match(uid):
+            errors.append(f'uid {uid!r} may only contain lowercase letters, digits and - _ . ~ %')
+        return errors
+
+    def field_errors(self, field: Dict[str, Any], value: Any) -> List[str]:
+        if value is None:
+            return []
+        field_type = field.get('type')
+        config = field.get('config', {})
+
+        if field_type == 'StructuredText':
+            return self.rich_text_errors(config, value)
+        if field_type == 'Date':
+            return [] if is_date(value) else [f'{value!r} is not a YYYY-MM-DD date']
+        if field_type == 'Timestamp':
+            return [] if is_timestamp(value) else [f'{value!r} is not an ISO 8601 timestamp']
+        if field_type in ('Text', 'Color'):
+            return [] if isinstance(value, str) else ['must be a string']
+        if field_type == 'Select':
+            options = config.get('options')
+            return [] if not options or value in options else [f'{value!r} is not one of {options}']
+        if field_type == 'Boolean':
+            return [] if isinstance(value, bool) else ['must be true or false']
+        if field_type == 'Number':
+            return [] if isinstance(value, (int, float)) and not isinstance(value, bool) else ['must be a number']
+        if field_type == 'Link':
+            return link_errors(value)
+        if field_type == 'Image':
+            return [] if isinstance(value, dict) and (value.get('id') or value.get('url')) else ['image needs an id or url']
+        if field_type == 'Group':
+            if not isinstance(value, list):
+                return ['must be a list']
+            errors = []
+            subfields = config.get('fields', {})
+            for i, item in enumerate(value):
+                for name, subvalue in (item or {}).items():
+                    if name not in subfields:
+                        errors.append(f'[{i}] unknown field {name!r}')
+                    else:
+                        errors.extend(f'[{i}].{name}: {error}' for error in self.field_errors(subfields[name], subvalue))
+            return errors
+        if field_type == 'Slices':
+            if not isinstance(value, list):
+                return ['must be a list']
+            choices = config.get('choices', {})
+            return [f"[{i}] unknown slice type {item.get('slice_type')!r}" for i, item in enumerate(value)
+                    if not isinstance(item, dict) or item.get('slice_type') not in choices]
+        return []
+
+    def rich_text_errors(self, config: Dict[str, Any], blocks: Any) -> List[str]:
+        if not isinstance(blocks, list):
+            return ['must be a list of blocks']
+        allowed = allowed_types(config)
+        errors = []
+        if config.get('single') and len(blocks) > 1:
+            errors.append(f'holds {len(blocks)} blocks, only one is allowed')
+
+        for i, block in enumerate(blocks):
+            block_type = block.get('type') if isinstance(block, dict) else None
+            if block_type not in TEXT_BLOCK_TYPES | EMBED_BLOCK_TYPES:
+                errors.append(f'[{i}] unknown block type {block_type!r}')
+                continue
+            if allowed is not None and block_type not in allowed:
+                errors.append(f'[{i}] {block_type} blocks are not allowed here')
+            if block_type == 'image':
+                # The asset ID is only filled in once the image is uploaded
+                if not block.get('id') and not block.get('url'):
+                    errors.append(f'[{i}] image needs an id or url')
+            elif block_type == 'embed':
+                if not isinstance(block.get('oembed'), dict):
+                    errors.append(f'[{i}] embed needs an oembed object')
+            else:
+                errors.extend(f'[{i}] {error}' for error in self.span_errors(config, allowed, block))
+        return errors
+
+    def span_errors(self, config: Dict[str, Any], allowed: Optional[set], block: Dict[str, Any]) -> List[str]:
+        text = block.get('text')
+        if not isinstance(text, str):
+            return ['text must be a string']
+        spans = block.get('spans')
+        if not isinstance(spans, list):
+            return ['spans must be a list']
+
+        errors = []
+        # Offsets count UTF-16 code units, so emoji and other astral characters take two
+        length = utf16_length(text)
+        for span in spans:
+            start, end, span_type = span.get('start'), span.get('end'), span.get('type')
+            if not (isinstance(start, int) and isinstance(end, int) and 0 <= start < end <= length):
+                errors.append(f'{span_type} span {start}..{end} is outside the text (length {length})')
+            if span_type not in SPAN_TYPES:
+                errors.append(f'unknown span type {span_type!r}')
+            elif allowed is not None and span_type not in allowed and span_type != 'label':
+                errors.append(f'{span_type} spans are not allowed here')
+            if span_type == 'hyperlink':
+                data = span.get('data')
+                errors.extend(link_errors(data))
+                if isinstance(data, dict) and data.get('target') and not config.get('allowTargetBlank'):
+                    errors.append('links may not open in a new tab here')
+        return errors
+
+    def validate_many(self, docs: Iterable[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Validate a batch of documents; returns the errors of the invalid ones by UID, duplicate UIDs included."""
+        invalid: Dict[str, List[str]] = {}
+        seen = set()
+        for doc in docs:
+            uid = doc.get('uid') or ''
+            errors = self.validate(doc)
+            if uid in seen:
+                errors.append('another document has the same uid')
+            seen.add(uid)
+            if errors:
+                invalid.setdefault(uid, []).extend(errors)
+        return invalid
+
+
+def is_date(value: Any) -> bool:
+    try:
+        date.fromisoformat(value)
+        return len(value) == 10
+    except (TypeError, ValueError):
+        return False
+
+
+def is_timestamp(value: Any) -> bool:
+    try:
+        datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return True
+    except (AttributeError, ValueError):
+        return False
+
+
+def link_errors(data: Any) -> List[str]:
+    if not isinstance(data, dict):
+        return ['link needs data']
+    link_type = data.get('link_type')
+    if link_type == 'Web':
+        return [] if data.get('url') else ['web link needs a url']
+    if link_type == 'Document':
+        return [] if data.get('id') else ['document link needs an id']
+    if link_type == 'Media':
+        return [] if data.get('id') or data.get('url') else ['media link needs an id or url']
+    if link_type == 'Any':
+        return []
+    return [f'unknown link type {link_type!r}']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Validate documents, one JSON document per line or a staging file, against the custom type models.')
+    parser.add_argument('path', help='JSON lines file of documents, or a staging file built by migrate.py --build')
+    parser.add_argument('--custom-types', default='customtypes', help='Directory of custom type models (customtypes/<id>/index.json)')
+    args = parser.parse_args()
+
+    validator = DocumentValidator(load_custom_types(args.custom_types))
+    with open(args.path, 'rb') as f:
+        is_staging_file = f.read(8) == b'WPSTAGE1'
+    if is_staging_file:
+        from staging import StagingReader
+        reader = StagingReader(args.path)
+        docs = [record['document'] for record in reader.records()]
+        reader.close()
+    else:
+        with open(args.path) as f:
+            docs = [json.loads(line) for line in f if line.strip()]
+
+    invalid = validator.validate_many(docs)
+    for uid, errors in invalid.items():
+        print(f"✗ {uid}")
+        for error in errors:
+            print(f"    {error}")
+    print(f"{len(docs) - len(invalid)} of {len(docs)} documents valid")
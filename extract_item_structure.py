@@ -38,8 +38,11 @@ def extract_first_item_structure(xml_file_path):
             print_structure(elem)
             break  # Exit after processing the first <item>
         
-        # It's important to clear the element to save memory
-        if event == 'end':
+        # It's important to clear the element to save memory, but only for
+        # elements directly under <channel>: the children of the <item> being
+        # printed must survive until its end event
+        parent = elem.getparent() if event == 'end' else None
+        if parent is not None and parent.tag == 'channel':
             elem.clear()
             while elem.getprevious() is not None:
                 del elem.getparent()[0]
@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+# A 1x1 JPEG, padded to the requested size with bytes derived from the path, so every fake media URL is a distinct file
+TINY_JPEG = bytes.fromhex(
+    'ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909080a0c140d0c0b0b0c1912130f'
+    '141d1a1f1e1d1a1c1c20242e2720222c231c1c2837292c30313434341f27393d38323c2e333432ffc0000b080001000101011100'
+    'ffc4001f0000010501010101010100000000000000000102030405060708090a0bffc400b5100002010303020403050504040000'
+    '017d01020300041105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a25262728292a'
+    '3435363738393a434445464748494a535455565758595a636465666768696a737475767778797a838485868788898a9293949596'
+    '9798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2'
+    'f3f4f5f6f7f8f9faffda0008010100003f00fbd3ffd9'
+)
+
+
+class EndpointLimit:
+    """Server-side token bucket answering 429 once an endpoint goes over `rate` requests per second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class FakePrismic:
+    """
+    In-memory stand-in for the Migration API (documents and status), the Asset API and the CDN API.
+
+    :param latency: Mean added latency per request, in seconds (jittered by +/-50%).
+    :param failure_rate: Probability of answering a request with a 500.
+    :param rates: Requests per second allowed per endpoint before answering 429; 0 is unlimited.
+    :param media_size: Size in bytes of the fake WordPress images served under /media/.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0,
+                 rates: Dict[str, float] = None, media_size: int = 50_000):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.limits = {endpoint: EndpointLimit(rate) for endpoint, rate in (rates or {}).items()}
+        self.media_size = media_size
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.assets: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def delay(self) -> None:
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def admit(self, endpoint: str) -> Optional[int]:
+        """Return an error status to inject for this request, if any."""
+        self.count(f'{endpoint}_requests')
+        limit = self.limits.get(endpoint)
+        if limit and not limit.allow():
+            self.count(f'{endpoint}_429')
+            return 429
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.count(f'{endpoint}_500')
+            return 500
+        return None
+
+    def media(self, path: str) -> bytes:
+        padding = hashlib.sha256(path.encode()).digest()
+        size = max(0, self.media_size - len(TINY_JPEG))
+        return TINY_JPEG + (padding * (size // len(padding) + 1))[:size]
+
+    def status(self, query: Dict[str, list]) -> Dict[str, Any]:
+        page_size = int(query.get('pageSize', ['100'])[0])
+        page = int(query.get('page', ['1'])[0])
+        with self.lock:
+            documents = list(self.documents.values())
+        return {
+            'page': page,
+            'total_pages': max(1, -(-len(documents) // page_size)),
+            'documents': [
+                {'id': doc['id'], 'uid': doc['uid'], 'type': doc['type'], 'status': 'draft', 'published': False}
+                for doc in documents[(page - 1) * page_size:page * page_size]
+            ],
+        }
+
+    def search(self, query: Dict[str, list]) -> Dict[str, Any]:
+        page_size = int(query.get('pageSize', ['20'])[0])
+        page = int(query.get('page', ['1'])[0])
+        with self.lock:
+            documents = list(self.documents.values())
+        results = documents[(page - 1) * page_size:page * page_size]
+        return {
+            'page': page,
+            'results_per_page': page_size,
+            'results_size': len(results),
+            'total_results_size': len(documents),
+            'total_pages': max(1, -(-len(documents) // page_size)),
+            'results': results,
+        }
+
+
+def make_handler(fake: FakePrismic):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def read_body(self) -> bytes:
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b';')[0], 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        return b''.join(chunks)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+            return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        def reply(self, status: int, payload: Any = None, body: bytes = None,
+                  content_type: str = 'application/json', headers: Dict[str, str] = None) -> None:
+            if body is None:
+                body = json.dumps(payload if payload is not None else {}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def handle_injected(self, endpoint: str) -> bool:
+            fake.delay()
+            status = fake.admit(endpoint)
+            if status == 429:
+                self.reply(429, {'message': 'Too many requests'}, headers={'Retry-After': '1'})
+            elif status:
+                self.reply(status, {'message': 'Injected failure'})
+            return bool(status)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path.startswith('/media/'):
+                fake.delay()
+                fake.count('media_requests')
+                self.reply(200, body=fake.media(url.path), content_type='image/jpeg')
+            elif url.path == '/api/v2':
+                if not self.handle_injected('cdn'):
+                    self.reply(200, {'refs': [{'id': 'master', 'ref': 'fake-master-ref', 'isMasterRef': True}]})
+            elif url.path == '/api/v2/documents/search':
+                if not self.handle_injected('cdn'):
+                    self.reply(200, fake.search(parse_qs(url.query)))
+            elif url.path == '/status':
+                if not self.handle_injected('migration'):
+                    self.reply(200, fake.status(parse_qs(url.query)))
+            elif url.path == '/stats':
+                with fake.lock:
+                    stats = dict(fake.stats, documents=len(fake.documents), assets=len(fake.assets))
+                self.reply(200, stats)
+            else:
+                self.reply(404, {'message': 'Not found'})
+
+        def do_POST(self) -> None:
+            body = self.read_body()
+            url = urlparse(self.path)
+            if url.path == '/documents':
+                if self.handle_injected('migration'):
+                    return
+                document = json.loads(body)
+                document_id = uuid.uuid4().hex[:16]
+                with fake.lock:
+                    fake.documents[document_id] = {
+                        'id': document_id,
+                        'uid': document.get('uid'),
+                        'type': document.get('type'),
+                        'last_publication_date': time.strftime('%Y-%m-%dT%H:%M:%S+0000', time.gmtime()),
+                        'data': {'title': document.get('data', {}).get('title', [])},
+                    }
+                self.reply(201, {'id': document_id, 'uid': document.get('uid'), 'type': document.get('type')})
+            elif url.path == '/assets':
+                if self.handle_injected('asset'):
+                    return
+                asset_id = uuid.uuid4().hex[:16]
+                with fake.lock:
+                    fake.assets[asset_id] = len(body)
+                self.reply(201, {'id': asset_id, 'size': len(body)})
+            else:
+                self.reply(404, {'message': 'Not found'})
+
+        def do_PUT(self) -> None:
+            body = self.read_body()
+            url = urlparse(self.path)
+            if not url.path.startswith('/documents/'):
+                self.reply(404, {'message': 'Not found'})
+                return
+            if self.handle_injected('migration'):
+                return
+            document_id = url.path.rsplit('/', 1)[-1]
+            if document_id not in fake.documents:
+                self.reply(404, {'message': 'Unknown document'})
+                return
+            document = json.loads(body)
+            self.reply(200, {'id': document_id, 'uid': document.get('uid'), 'type': document.get('type')})
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the Prismic Migration, Asset and CDN APIs.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean added latency per request, in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of API requests answered with a 500')
+    parser.add_argument('--migration-rps', type=float, default=0.0, help='Migration API requests/s before 429s (0: unlimited)')
+    parser.add_argument('--asset-rps', type=float, default=0.0, help='Asset API requests/s before 429s (0: unlimited)')
+    parser.add_argument('--cdn-rps', type=float, default=0.0, help='CDN API requests/s before 429s (0: unlimited)')
+    parser.add_argument('--media-size', type=int, default=50_000, help='Size of the fake WordPress images, in bytes')
+    args = parser.parse_args()
+
+    fake = FakePrismic(
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        rates={'migration': args.migration_rps, 'asset': args.asset_rps, 'cdn': args.cdn_rps},
+        media_size=args.media_size,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Fake Prismic listening on {base_url}", flush=True)
+    print(f"  PRISMIC_MIGRATION_URL={base_url}/documents")
+    print(f"  PRISMIC_ASSET_URL={base_url}/assets")
+    print(f"  PRISMIC_STATUS_URL={base_url}/status")
+    print(f"  PRISMIC_API_URL={base_url}/api/v2")
+    print(f"  WordPress media: {base_url}/media/<path>", flush=True)
+    server.serve_forever()
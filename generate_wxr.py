@@ -0,0 +1,327 @@
+import argparse
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import IO, Any, Dict, List, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from wxr_reader import iter_items, parse_item
+
+TAG_PATTERN = re.compile(r'<[^>]+>|\[/?caption[^\]]*\]')
+SENTENCE_PATTERN = re.compile(r'[^.!?\n]+[.!?]')
+
+
+def cdata(text: str) -> str:
+    """Wrap text in a CDATA section, splitting any ']]>' it contains."""
+    return '<![CDATA[' + text.replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+
+def php_serialize_image_meta(file: str, width: int, height: int) -> str:
+    """The `_wp_attachment_metadata` value WordPress stores for an image, as in the fixture."""
+    def s(value: str) -> str:
+        return f's:{len(value.encode())}:"{value}";'
+    return (
+        f'a:5:{{{s("width")}i:{width};{s("height")}i:{height};{s("file")}{s(file)}'
+        f'{s("sizes")}a:0:{{}}{s("image_meta")}a:0:{{}}}}'
+    )
+
+
+class Corpus:
+    """Sentences, titles, categories and tags taken from a real export, to make the fake content look like it."""
+
+    def __init__(self, fixture_path: str):
+        self.sentences: List[str] = []
+        self.titles: List[str] = []
+        self.categories: List[Tuple[str, str, str]] = []
+        self.header = ''
+
+        seen_categories = set()
+        for item in iter_items(fixture_path):
+            post = parse_item(item)
+            if post['post_type'] == 'post':
+                self.titles.append(post['title'])
+                text = TAG_PATTERN.sub(' ', post['content']).replace('&nbsp;', ' ')
+                self.sentences.extend(s.strip() for s in SENTENCE_PATTERN.findall(text) if len(s.strip()) > 20)
+            for category in item.findall('category'):
+                key = (category.get('domain'), category.get('nicename'), category.text or '')
+                if key not in seen_categories:
+                    seen_categories.add(key)
+                    self.categories.append(key)
+
+        # Everything before the first <item>: RSS root, channel metadata and authors
+        with open(fixture_path, encoding='utf-8') as f:
+            for line in f:
+                if '<item>' in line:
+                    break
+                self.header += line
+
+        self.sentences = self.sentences or ['Lorem ipsum dolor sit amet.']
+        self.titles = self.titles or ['Untitled post']
+        self.words = sorted({w for s in self.titles for w in s.split() if w.isalpha()}) or ['post']
+
+
+class WxrGenerator:
+    """
+    Stream a synthetic WXR 1.2 export shaped like a real one.
+
+    Items are written one at a time, so exports of any size can be produced
+    in constant memory. Every post comes with its attachments (referenced
+    from [caption] shortcodes), postmeta, categories and tags, and a comment
+    thread; a few drafts and pages are mixed in as real exports have them.
+    """
+
+    def __init__(self, corpus: Corpus, site_url: str, media_url: str, seed: int = 0,
+                 paragraphs: int = 6, comments_per_post: int = 3, draft_ratio: float = 0.05,
+                 page_ratio: float = 0.02, shared_image_ratio: float = 0.2):
+        self.corpus = corpus
+        self.site_url = site_url.rstrip('/')
+        self.media_url = media_url.rstrip('/')
+        self.random = random.Random(seed)
+        self.paragraphs = paragraphs
+        self.comments_per_post = comments_per_post
+        self.draft_ratio = draft_ratio
+        self.page_ratio = page_ratio
+        self.shared_image_ratio = shared_image_ratio
+        self.next_id = 1000
+        self.next_comment_id = 1
+        self.start = datetime(2012, 1, 1)
+        self.shared_image: Dict[str, Any] = None
+        self.published: List[Tuple[str, str]] = []
+
+    def new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def dates(self, post_id: int) -> Dict[str, str]:
+        published = self.start + timedelta(minutes=37 * post_id)
+        modified = published + timedelta(days=self.random.randint(0, 30))
+        return {
+            'pubDate': published.strftime('%a, %d %b %Y %H:%M:%S +0000'),
+            'post_date': (published + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            'post_date_gmt': published.strftime('%Y-%m-%d %H:%M:%S'),
+            'post_modified': (modified + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            'post_modified_gmt': modified.strftime('%Y-%m-%d %H:%M:%S'),
+            'folder': published.strftime('%Y/%m'),
+        }
+
+    def postmeta(self, key: str, value: str) -> str:
+        return (
+            f'\t\t<wp:postmeta>\n\t\t<wp:meta_key>{escape(key)}</wp:meta_key>\n'
+            f'\t\t<wp:meta_value>{cdata(value)}</wp:meta_value>\n\t\t</wp:postmeta>\n'
+        )
+
+    def item(self, fields: Dict[str, Any], extra: str = '') -> str:
+        """Render an <item> with the child elements in the order WordPress exports them."""
+        return (
+            '\t<item>\n'
+            f'\t\t<title>{escape(fields["title"])}</title>\n'
+            f'\t\t<link>{escape(fields["link"])}</link>\n'
+            f'\t\t<pubDate>{fields["pubDate"]}</pubDate>\n'
+            '\t\t<dc:creator>awpnetwork</dc:creator>\n'
+            f'\t\t<guid isPermaLink="false">{escape(fields["guid"])}</guid>\n'
+            '\t\t<description/>\n'
+            f'\t\t<content:encoded>{cdata(fields.get("content", ""))}</content:encoded>\n'
+            f'\t\t<excerpt:encoded>{cdata(fields.get("excerpt", ""))}</excerpt:encoded>\n'
+            f'\t\t<wp:post_id>{fields["post_id"]}</wp:post_id>\n'
+            f'\t\t<wp:post_date>{fields["post_date"]}</wp:post_date>\n'
+            f'\t\t<wp:post_date_gmt>{fields["post_date_gmt"]}</wp:post_date_gmt>\n'
+            f'\t\t<wp:post_modified>{fields["post_modified"]}</wp:post_modified>\n'
+            f'\t\t<wp:post_modified_gmt>{fields["post_modified_gmt"]}</wp:post_modified_gmt>\n'
+            '\t\t<wp:comment_status>open</wp:comment_status>\n'
+            '\t\t<wp:ping_status>open</wp:ping_status>\n'
+            f'\t\t<wp:post_name>{escape(fields["post_name"])}</wp:post_name>\n'
+            f'\t\t<wp:status>{fields["status"]}</wp:status>\n'
+            f'\t\t<wp:post_parent>{fields.get("post_parent", 0)}</wp:post_parent>\n'
+            '\t\t<wp:menu_order>0</wp:menu_order>\n'
+            f'\t\t<wp:post_type>{fields["post_type"]}</wp:post_type>\n'
+            '\t\t<wp:post_password></wp:post_password>\n'
+            '\t\t<wp:is_sticky>0</wp:is_sticky>\n'
+            f'{extra}'
+            '\t</item>\n'
+        )
+
+    def attachment(self, parent_id: int, folder: str) -> Tuple[str, Dict[str, Any]]:
+        post_id = self.new_id()
+        name = f'image-{post_id}'
+        file = f'{folder}/{name}.jpg'
+        url = f'{self.media_url}/wp-content/uploads/{file}'
+        width, height = self.random.choice([(490, 326), (362, 313), (640, 427), (1024, 683)])
+        dates = self.dates(post_id)
+        caption = self.random.choice(self.corpus.sentences)
+
+        extra = f'\t\t<wp:attachment_url>{escape(url)}</wp:attachment_url>\n'
+        extra += self.postmeta('_wp_attached_file', file)
+        extra += self.postmeta('_wp_attachment_metadata', php_serialize_image_meta(file, width, height))
+        xml = self.item({
+            'title': name,
+            'link': f'{self.site_url}/{name}/',
+            'guid': url,
+            'excerpt': caption,
+            'post_id': post_id,
+            'post_name': name,
+            'status': 'inherit',
+            'post_parent': parent_id,
+            'post_type': 'attachment',
+            **dates,
+        }, extra)
+        return xml, {'id': post_id, 'url': url, 'width': width, 'height': height, 'caption': caption}
+
+    def caption(self, image: Dict[str, Any]) -> str:
+        return (
+            f'[caption id="attachment_{image["id"]}" align="alignnone" width="{image["width"]}"]'
+            f'<a href={quoteattr(image["url"])}><img class="size-full wp-image-{image["id"]}" '
+            f'title={quoteattr(image["caption"][:40])} alt="" src={quoteattr(image["url"])} '
+            f'width="{image["width"]}" height="{image["height"]}" /></a> {escape(image["caption"])}[/caption]'
+        )
+
+    def content(self, images: List[Dict[str, Any]]) -> str:
+        """Post HTML the way WordPress stores it: auto-paragraphed text, lists, headings and captions."""
+        blocks = []
+        images = list(images)
+        for i in range(self.paragraphs):
+            roll = self.random.random()
+            if images and (i == 0 or roll < 0.15):
+                blocks.append(self.caption(images.pop()))
+            elif roll < 0.25:
+                blocks.append(f'<h2>{escape(self.random.choice(self.corpus.titles))}</h2>')
+            elif roll < 0.35:
+                items = ''.join(f'\n\t<li><strong>{escape(s)}</strong></li>'
+                                for s in self.random.sample(self.corpus.sentences, min(3, len(self.corpus.sentences))))
+                blocks.append(f'<ul>{items}\n</ul>')
+            else:
+                sentences = [escape(s) for s in self.random.choices(self.corpus.sentences, k=3)]
+                if self.published and roll < 0.5:
+                    title, link = self.random.choice(self.published)
+                    sentences.append(f'See also <a href={quoteattr(link)}>{escape(title)}</a>.')
+                elif roll < 0.6:
+                    sentences[0] = f'<em>{sentences[0]}</em>'
+                blocks.append(' '.join(sentences))
+        blocks.extend(self.caption(image) for image in images)
+        return '\n\n'.join(blocks)
+
+    def comments(self, post_id: int, dates: Dict[str, str]) -> str:
+        xml = ''
+        thread: List[int] = []
+        for _ in range(self.random.randint(0, self.comments_per_post * 2)):
+            comment_id = self.next_comment_id
+            self.next_comment_id += 1
+            parent = self.random.choice(thread) if thread and self.random.random() < 0.4 else 0
+            thread.append(comment_id)
+            xml += (
+                '\t\t<wp:comment>\n'
+                f'\t\t\t<wp:comment_id>{comment_id}</wp:comment_id>\n'
+                f'\t\t\t<wp:comment_author>{cdata(self.random.choice(self.corpus.words))}</wp:comment_author>\n'
+                f'\t\t\t<wp:comment_author_email>reader{comment_id}@example.com</wp:comment_author_email>\n'
+                '\t\t\t<wp:comment_author_url></wp:comment_author_url>\n'
+                '\t\t\t<wp:comment_author_IP>127.0.0.1</wp:comment_author_IP>\n'
+                f'\t\t\t<wp:comment_date>{dates["post_modified"]}</wp:comment_date>\n'
+                f'\t\t\t<wp:comment_date_gmt>{dates["post_modified_gmt"]}</wp:comment_date_gmt>\n'
+                f'\t\t\t<wp:comment_content>{cdata(self.random.choice(self.corpus.sentences))}</wp:comment_content>\n'
+                '\t\t\t<wp:comment_approved>1</wp:comment_approved>\n'
+                '\t\t\t<wp:comment_type>comment</wp:comment_type>\n'
+                f'\t\t\t<wp:comment_parent>{parent}</wp:comment_parent>\n'
+                '\t\t\t<wp:comment_user_id>0</wp:comment_user_id>\n'
+                '\t\t</wp:comment>\n'
+            )
+        return xml
+
+    def post(self, out: IO[str], attachments_per_post: int) -> None:
+        post_id = self.new_id()
+        dates = self.dates(post_id)
+        title = f'{self.random.choice(self.corpus.titles)} {post_id}'
+        name = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')
+        link = f'{self.site_url}/{dates["folder"]}/{name}/'
+        roll = self.random.random()
+        post_type = 'page' if roll < self.page_ratio else 'post'
+        status = 'draft' if roll > 1 - self.draft_ratio else 'publish'
+
+        images = []
+        for _ in range(attachments_per_post):
+            xml, image = self.attachment(post_id, dates['folder'])
+            out.write(xml)
+            images.append(image)
+
+        # A banner shared by many posts, to exercise asset deduplication
+        if self.shared_image is None:
+            xml, self.shared_image = self.attachment(post_id, dates['folder'])
+            out.write(xml)
+        if self.random.random() < self.shared_image_ratio:
+            images.append(self.shared_image)
+
+        extra = ''.join(
+            f'\t\t<category domain="{domain}" nicename="{escape(nicename)}">{cdata(label)}</category>\n'
+            for domain, nicename, label in self.random.sample(self.corpus.categories, min(4, len(self.corpus.categories)))
+        )
+        extra += self.postmeta('_edit_last', '2')
+        if images:
+            extra += self.postmeta('_thumbnail_id', str(images[0]['id']))
+        extra += self.comments(post_id, dates)
+
+        out.write(self.item({
+            'title': title,
+            'link': link,
+            'guid': f'{self.site_url}/?p={post_id}',
+            'content': self.content(images),
+            'post_id': post_id,
+            'post_name': name,
+            'status': status,
+            'post_type': post_type,
+            **dates,
+        }, extra))
+
+        if status == 'publish':
+            self.published.append((title, link))
+            if len(self.published) > 1000:
+                self.published.pop(0)
+
+    def write(self, out: IO[str], posts: int, attachments: int) -> None:
+        out.write(self.corpus.header)
+        per_post, remainder = divmod(attachments, max(1, posts))
+        for i in range(posts):
+            self.post(out, per_post + (1 if i < remainder else 0))
+        out.write('\t</channel>\n</rss>\n')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a synthetic WordPress (WXR 1.2) export for scale testing.')
+    parser.add_argument('output', help="Output file, or '-' for stdout")
+    parser.add_argument('--posts', type=int, default=1000, help='Number of posts')
+    parser.add_argument('--attachments', type=int, default=None, help='Number of attachments (default: 3 per post)')
+    parser.add_argument('--paragraphs', type=int, default=6, help='Blocks of content per post')
+    parser.add_argument('--comments', type=int, default=3, help='Average comments per post')
+    parser.add_argument('--draft-ratio', type=float, default=0.05, help='Fraction of posts left as drafts')
+    parser.add_argument('--page-ratio', type=float, default=0.02, help='Fraction of items that are pages')
+    parser.add_argument('--fixture', default='wordpress.xml', help='Real export the structure and text are taken from')
+    parser.add_argument('--site-url', default=None, help='Site URL used for links (default: from the fixture)')
+    parser.add_argument('--media-url', default=None, help='Base URL images are served from (default: the site URL)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible exports')
+    args = parser.parse_args()
+
+    corpus = Corpus(args.fixture)
+    site_url = args.site_url
+    if site_url is None:
+        match = re.search(r'<wp:base_site_url>([^<]+)</wp:base_site_url>', corpus.header)
+        site_url = match.group(1) if match else 'https://example.com'
+
+    generator = WxrGenerator(
+        corpus,
+        site_url=site_url,
+        media_url=args.media_url or site_url,
+        seed=args.seed,
+        paragraphs=args.paragraphs,
+        comments_per_post=args.comments,
+        draft_ratio=args.draft_ratio,
+        page_ratio=args.page_ratio,
+    )
+    attachments = args.attachments if args.attachments is not None else args.posts * 3
+
+    if args.output == '-':
+        generator.write(sys.stdout, args.posts, attachments)
+    else:
+        with open(args.output, 'w', encoding='utf-8', buffering=1024 * 1024) as out:
+            generator.write(out, args.posts, attachments)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+# Formats worth recompressing, and the extension their cached results get
+OPTIMIZABLE_TYPES = {
+    'image/jpeg': ('JPEG', '.jpg'),
+    'image/png': ('PNG', '.png'),
+    'image/webp': ('WEBP', '.webp'),
+}
+
+# Marks a source image that optimizing doesn't shrink, so reruns don't try again
+SKIPPED = '.skip'
+
+
+def optimize_image(source_path: str, target_path: str, content_type: str, max_dimension: int, quality: int) -> bool:
+    """
+    Downscale and recompress an image, without its EXIF or XMP metadata.
+
+    Runs in a worker process. The result is written to `target_path` only if
+    it is smaller than the source; otherwise an empty `target_path + SKIPPED`
+    marker is written instead. Returns whether an optimized file was written.
+    """
+    image_format, _ = OPTIMIZABLE_TYPES[content_type]
+    with Image.open(source_path) as image:
+        if getattr(image, 'n_frames', 1) > 1:
+            # Animations would lose every frame but the first
+            optimized = None
+        else:
+            # Bake the EXIF orientation into the pixels, since the EXIF block is dropped
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGB' if image_format == 'JPEG' else 'RGBA')
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+            tmp_path = f'{target_path}.{os.getpid()}.tmp'
+            options = {'optimize': True}
+            if image_format in ('JPEG', 'WEBP'):
+                options.update(quality=quality)
+            if image_format == 'JPEG':
+                options.update(progressive=True)
+                if image.mode in ('RGBA', 'LA'):
+                    image = image.convert('RGB')
+            if image.info.get('icc_profile'):
+                # Keep the colour profile, which changes how the image renders
+                options['icc_profile'] = image.info['icc_profile']
+            image.save(tmp_path, image_format, **options)
+            optimized = tmp_path
+
+    if optimized and os.path.getsize(optimized) < os.path.getsize(source_path):
+        os.replace(optimized, target_path)
+        return True
+
+    if optimized:
+        os.remove(optimized)
+    open(target_path + SKIPPED, 'w').close()
+    return False
+
+
+class ImageOptimizer:
+    """
+    Shrinks images before they're uploaded, in a pool of worker processes.
+
+    Results are kept in `cache_dir`, named after the source file's content
+    hash and the settings, so a rerun reuses them without decoding anything.
+    Requires Pillow; without it, or for images it can't decode, the original
+    file is uploaded unchanged.
+
+    :param cache_dir: Directory holding optimized images.
+    :param max_dimension: Longest side, in pixels, images are downscaled to.
+    :param quality: JPEG and WebP quality (1-95).
+    :param workers: Worker processes (default: one per core).
+    """
+
+    def __init__(self, cache_dir: str = 'optimized_images', max_dimension: int = 2048,
+                 quality: int = 82, workers: int = None):
+        self.cache_dir = cache_dir
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.workers = workers
+        self.pool: ProcessPoolExecutor = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, sha256: str, content_type: str) -> str:
+        _, extension = OPTIMIZABLE_TYPES[content_type]
+        return os.path.join(self.cache_dir, f'{sha256}-{self.max_dimension}-q{self.quality}{extension}')
+
+    async def optimize(self, source_path: str, sha256: str, content_type: str) -> Optional[str]:
+        """Return the path of an optimized copy of an image, or None to upload the original."""
+        if not PILLOW_AVAILABLE or content_type not in OPTIMIZABLE_TYPES:
+            return None
+
+        target_path = self.cache_path(sha256, content_type)
+        if os.path.exists(target_path):
+            return target_path
+        if os.path.exists(target_path + SKIPPED):
+            return None
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        try:
+            optimized = await loop.run_in_executor(
+                self.pool, optimize_image, source_path, target_path, content_type, self.max_dimension, self.quality
+            )
+        except Exception as e:
+            # Usually a file Pillow can't decode; don't try it again on the next run
+            print(f"Could not optimize image {sha256[:12]}, uploading the original: {str(e)}")
+            open(target_path + SKIPPED, 'w').close()
+            return None
+        return target_path if optimized else None
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
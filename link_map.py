@@ -0,0 +1,105 @@
+from typing import Any, Dict, IO, Iterable, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from transform import document_uid
+from wxr_reader import item_text, iter_items, site_host
+
+# Query parameters WordPress resolves to a post or page by ID, as in `/?p=123`
+ID_PARAMETERS = ('p', 'page_id')
+
+
+def link_key(url: str) -> Optional[str]:
+    """
+    The key a link is looked up by: the post ID of `?p=` links, otherwise the path.
+
+    Scheme, host, trailing slash and fragment are ignored, so `http://site/a/`,
+    `https://www.site/a#top` and `/a` all find the same post.
+    """
+    parts = urlsplit(url.strip())
+    query = parse_qs(parts.query)
+    for parameter in ID_PARAMETERS:
+        if query.get(parameter):
+            return f'id:{query[parameter][0]}'
+    path = parts.path.rstrip('/')
+    return f'path:{path}' if path else None
+
+
+class LinkMap:
+    """
+    Where every migrated post of the export ends up in Prismic, by any URL WordPress links it with.
+
+    Built in one scan of the export: each published post is reachable by its
+    permalink (<link>), its <guid> and `?p=<wp:post_id>`, and maps to its
+    UID. Document IDs are added as documents are found in or sent to
+    Prismic. `rewrite` then turns links to those posts into Document links
+    with dictionary lookups only.
+    """
+
+    def __init__(self):
+        # link_key() -> UID
+        self.uids: Dict[str, str] = {}
+        # UID -> Prismic document ID, for posts already in Prismic
+        self.document_ids: Dict[str, str] = {}
+        # Hosts the site was served from; links to other hosts are never internal
+        self.hosts: Set[str] = set()
+
+    @classmethod
+    def from_export(cls, xml_path: str|IO[bytes]) -> 'LinkMap':
+        link_map = cls()
+        for item in iter_items(xml_path):
+            if item_text(item, 'wp:post_type') == 'post' and item_text(item, 'wp:status') == 'publish':
+                uid = document_uid({'uid': item_text(item, 'wp:post_name'), 'title': item_text(item, 'title')})
+                link_map.add_post(uid, item_text(item, 'wp:post_id'), [item_text(item, 'link'), item_text(item, 'guid')])
+        return link_map
+
+    def add_post(self, uid: str, post_id: str, urls: Iterable[str]) -> None:
+        if not uid:
+            return
+        if post_id:
+            self.uids[f'id:{post_id}'] = uid
+        for url in urls:
+            key = link_key(url) if url else None
+            if key:
+                self.uids[key] = uid
+                self.hosts.add(site_host(url))
+
+    def add_documents(self, documents: Dict[str, str]) -> None:
+        """Record the Prismic document IDs of UIDs (UID -> ID)."""
+        self.document_ids.update(documents)
+
+    def target(self, url: str) -> Optional[str]:
+        """The UID of the post a link points to, if it points to a post of this export."""
+        host = site_host(url)
+        if host and host not in self.hosts:
+            return None
+        if not host and url.startswith(('mailto:', 'tel:', '#')):
+            return None
+        key = link_key(url)
+        return self.uids.get(key) if key else None
+
+    def rewrite(self, prismic_doc: Dict[str, Any]) -> Tuple[int, int]:
+        """
+        Turn the document's links to other migrated posts into Document links, in place.
+
+        Returns how many links were rewritten, and how many internal links
+        could not be yet because their target has no Prismic document ID so far.
+        """
+        rewritten = unresolved = 0
+        for block in prismic_doc['data']['body']:
+            for span in block.get('spans', ()):
+                data = span.get('data')
+                if span['type'] != 'hyperlink' or not data or data.get('link_type') != 'Web':
+                    continue
+                uid = self.target(data['url'])
+                if not uid:
+                    continue
+                document_id = self.document_ids.get(uid)
+                if document_id:
+                    span['data'] = {'link_type': 'Document', 'id': document_id}
+                    rewritten += 1
+                else:
+                    unresolved += 1
+        return rewritten, unresolved
+
+    def __len__(self) -> int:
+        return len(self.uids)
@@ -0,0 +1,128 @@
+import argparse
+import glob
+import json
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from migration_journal import FAILED, read_journal
+from post_fingerprints import FingerprintStore
+
+SHARD_SUFFIX = re.compile(r'\.shard-(\d+)-of-(\d+)$')
+
+
+def find_shard_files(path: str) -> List[Tuple[int, int, str]]:
+    """Every per-shard variant of a state file, as (index, count, path), in shard order."""
+    root, extension = os.path.splitext(path)
+    shards = []
+    for shard_file in glob.glob(f'{glob.escape(root)}.shard-*-of-*{glob.escape(extension)}'):
+        match = SHARD_SUFFIX.search(os.path.splitext(shard_file)[0])
+        if match:
+            shards.append((int(match.group(1)), int(match.group(2)), shard_file))
+    return sorted(shards)
+
+
+def report(journals: List[Tuple[int, int, str]]) -> Dict[str, Any]:
+    """Per-shard and overall post counts by state, failures, and UIDs claimed by more than one shard."""
+    shards = {}
+    totals: Counter = Counter()
+    owners: Dict[str, List[int]] = {}
+    failures = []
+
+    for index, count, path in journals:
+        entries = read_journal(path)
+        states = Counter(entry['state'] for entry in entries.values())
+        shards[f'{index}/{count}'] = dict(states)
+        totals.update(states)
+        for uid, entry in entries.items():
+            owners.setdefault(uid, []).append(index)
+            if entry['state'] == FAILED:
+                failures.append({'shard': index, 'uid': uid, 'reason': entry.get('reason', '')})
+
+    return {
+        'shards': shards,
+        'total': dict(totals),
+        'failures': failures,
+        # Two WordPress posts with the same slug: only one of them can become a document
+        'conflicts': {uid: indexes for uid, indexes in owners.items() if len(indexes) > 1},
+    }
+
+
+def merge_journals(journals: List[Tuple[int, int, str]], output_path: str) -> int:
+    """Append every shard's journal lines to `output_path`, in time order; returns the number of lines."""
+    lines = []
+    for _, _, path in journals:
+        with open(path) as f:
+            for line in f:
+                try:
+                    lines.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    lines.sort(key=lambda entry: entry.get('time', 0))
+
+    with open(output_path, 'a') as f:
+        for entry in lines:
+            f.write(json.dumps(entry) + '\n')
+    return len(lines)
+
+
+def merge_fingerprints(stores: List[Tuple[int, int, str]], output_path: str) -> int:
+    """Copy every shard's fingerprints into `output_path`; returns the number of rows."""
+    merged = FingerprintStore(output_path)
+    rows = 0
+    try:
+        for _, _, path in stores:
+            merged.conn.execute('ATTACH DATABASE ? AS shard', (path,))
+            with merged.conn:
+                rows += merged.conn.execute('INSERT OR REPLACE INTO fingerprints SELECT * FROM shard.fingerprints').rowcount
+            merged.conn.execute('DETACH DATABASE shard')
+    finally:
+        merged.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Report on a sharded migration and merge its per-shard state.')
+    parser.add_argument('--journal', default='migration_journal.jsonl', help='Journal path the shards were given')
+    parser.add_argument('--fingerprints', default='post_fingerprints.sqlite3', help='Fingerprints path the shards were given')
+    parser.add_argument('--merge', action='store_true', help='Merge the shard journals and fingerprints into the unsharded files')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    journals = find_shard_files(args.journal)
+    if not journals:
+        print(f"No shard journals found next to {args.journal}")
+        return
+
+    counts = {count for _, count, _ in journals}
+    missing = {(index, count) for count in counts for index in range(1, count + 1)} - {(i, c) for i, c, _ in journals}
+
+    summary = report(journals)
+    summary['missing_shards'] = [f'{index}/{count}' for index, count in sorted(missing)]
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        for shard, states in summary['shards'].items():
+            print(f"Shard {shard}: " + ', '.join(f"{count} {state}" for state, count in sorted(states.items())))
+        print(f"Total: " + ', '.join(f"{count} {state}" for state, count in sorted(summary['total'].items())))
+        if summary['missing_shards']:
+            print(f"No journal for shards: {', '.join(summary['missing_shards'])}")
+        if len(counts) > 1:
+            print(f"Warning: journals from different shard counts ({', '.join(map(str, sorted(counts)))})")
+        for uid, indexes in summary['conflicts'].items():
+            print(f"Conflict: UID {uid} was migrated by shards {', '.join(map(str, indexes))}")
+        for failure in summary['failures']:
+            print(f"✗ Shard {failure['shard']}: {failure['uid']}: {failure['reason']}")
+
+    if args.merge:
+        lines = merge_journals(journals, args.journal)
+        print(f"\nMerged {lines} journal lines into {args.journal}")
+        stores = find_shard_files(args.fingerprints)
+        if stores:
+            rows = merge_fingerprints(stores, args.fingerprints)
+            print(f"Merged {rows} fingerprints into {args.fingerprints}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import asyncio
+import bisect
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# A metric name plus its sorted (label, value) pairs
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _format_key(key: Key) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}'
+
+
+class Histogram:
+    """Cumulative latency histogram, as Prometheus represents one."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': self.quantile(0.50),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    In-process counters, gauges and latency histograms for a migration run.
+
+    Everything is updated from the event loop thread, so no locking is
+    needed. Gauges can also be callables, sampled whenever a snapshot is
+    taken (e.g. the depth of a pipeline queue).
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters: Dict[Key, float] = {}
+        self.gauges: Dict[Key, Any] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float|Callable[[], float], **labels: Any) -> None:
+        self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Observe how long the body of a `with` block takes, including any awaits inside it."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels: Any) -> float:
+        return self.counters.get(_key(name, labels), 0)
+
+    def counter_total(self, name: str) -> float:
+        """A counter summed across all of its label sets."""
+        return sum(value for key, value in self.counters.items() if key[0] == name)
+
+    def gauge_value(self, name: str, **labels: Any) -> Optional[float]:
+        value = self.gauges.get(_key(name, labels))
+        return value() if callable(value) else value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All current values, keyed by Prometheus-style names, ready to be dumped as JSON."""
+        return {
+            'timestamp': round(time.time(), 3),
+            'elapsed': round(time.monotonic() - self.started, 3),
+            'counters': {_format_key(key): value for key, value in sorted(self.counters.items())},
+            'gauges': {_format_key(key): (value() if callable(value) else value)
+                       for key, value in sorted(self.gauges.items())},
+            'histograms': {_format_key(key): histogram.as_dict()
+                           for key, histogram in sorted(self.histograms.items())},
+        }
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        typed = set()
+
+        def declare(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for key, value in sorted(self.counters.items()):
+            declare(key[0], 'counter')
+            lines.append(f'{_format_key(key)} {value}')
+        for key, value in sorted(self.gauges.items()):
+            declare(key[0], 'gauge')
+            lines.append(f'{_format_key(key)} {value() if callable(value) else value}')
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{_format_key((name + "_bucket", labels + (("le", le),)))} {cumulative}')
+            lines.append(f'{_format_key((name + "_sum", labels))} {histogram.sum}')
+            lines.append(f'{_format_key((name + "_count", labels))} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}' if hours else f'{minutes}:{seconds:02d}'
+
+
+def progress_line(metrics: Metrics) -> str:
+    """One-line summary of throughput so far, with an ETA based on how much of the export has been read."""
+    elapsed = time.monotonic() - metrics.started
+    created = metrics.counter_value('documents_sent_total', result='created')
+    updated = metrics.counter_value('documents_sent_total', result='updated')
+    failed = metrics.counter_value('documents_sent_total', result='failed')
+    skipped = metrics.counter_total('posts_skipped_total')
+    assets = metrics.counter_value('assets_uploaded_total')
+    line = (f'{created + updated:.0f} sent ({failed:.0f} failed, {skipped:.0f} skipped), '
+            f'{assets:.0f} assets, {(created + updated) / elapsed if elapsed else 0:.1f} docs/s')
+
+    read = metrics.gauge_value('export_bytes_read')
+    total = metrics.gauge_value('export_bytes_total')
+    if read and total:
+        fraction = min(1.0, read / total)
+        line = f'{fraction:6.1%} | ' + line
+        if fraction > 0:
+            line += f' | ETA {format_duration(elapsed / fraction - elapsed)}'
+    return line + f' | {format_duration(elapsed)} elapsed'
+
+
+class MetricsReporter:
+    """
+    Periodically export a `Metrics` snapshot while a migration runs.
+
+    :param metrics: The metrics to export.
+    :param path: File to write to; `.prom` files are rewritten in the Prometheus
+        text format on every tick, anything else gets one JSON line appended
+        per tick. None only shows progress.
+    :param interval: Seconds between exports.
+    :param progress: Show a live progress/ETA line on stderr.
+    """
+
+    def __init__(self, metrics: Metrics, path: str = None, interval: float = 5.0, progress: bool = True):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.progress = progress and sys.stderr.isatty()
+        self.task: asyncio.Task = None
+
+    def export(self) -> None:
+        if self.path and self.path.endswith('.prom'):
+            # Written atomically, so a scraper (e.g. node_exporter's textfile collector) never reads half a file
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.metrics.to_prometheus())
+            os.replace(tmp_path, self.path)
+        elif self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.metrics.snapshot(), separators=(',', ':')) + '\n')
+
+        if self.progress:
+            sys.stderr.write('\r\033[K' + progress_line(self.metrics))
+            sys.stderr.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.export()
+
+    async def __aenter__(self) -> 'MetricsReporter':
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.export()
+        if self.progress:
+            sys.stderr.write('\n')
@@ -1,298 +1,682 @@
 import os
-import xml.etree.ElementTree as ET
-from datetime import datetime
 import time
-from typing import Dict, List, Any, Tuple
+from typing import IO, Dict, List, Any, Set, Tuple, Iterable, Iterator
+from itertools import islice
 import httpx
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-import re
 import json
 import asyncio
-from urllib.parse import urlparse, unquote
-from pathlib import Path
-import requests
+import contextlib
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+from wxr_reader import export_site_hosts, iter_items, item_text, media_key, parse_item, site_host
+from pipeline import Stage, run_pipeline, batched
+import transform
+from rate_limiter import RateLimiter
+from asset_cache import AssetCache
+from uid_index import UidIndex, publication_timestamp
+from migration_journal import MigrationJournal, PARSED, ASSETS_UPLOADED, CREATED, UPDATED, FAILED
+from post_fingerprints import FingerprintStore, content_fingerprint
+from metrics import Metrics, MetricsReporter
+from image_optimizer import ImageOptimizer, PILLOW_AVAILABLE
+from sharding import Shard, in_shard, parse_shard, shard_path
+from asset_stream import MultipartFileStream, asset_content_type, asset_filename, spool_download
+from wxr_index import WxrIndex, open_index
+from transform_cache import DEFAULT_MAX_BYTES, TransformCache
+from staging import StagingReader, StagingWriter
+from link_map import LinkMap
+from document_schema import DocumentValidator, load_custom_types
+from retry import CLOSED, UNSENT_ERRORS, CircuitBreaker, DeadLetterQueue, RetryPolicy, describe_error, is_retryable
 load_dotenv()
 
+try:
+    import h2  # noqa: F401 -- enables httpx's optional HTTP/2 support
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Starting requests per second for each Prismic endpoint; the limiter adapts from there
+DEFAULT_RATES = {
+    'migration': 1.0,
+    'asset': 1.0,
+    'cdn': 10.0,
+}
+
+# Fields of a post kept next to its document in a staging file, all that sending needs
+STAGED_POST_FIELDS = ('post_id', 'title', 'modified_gmt', 'sha256', 'document_id')
+
+# Largest page size the Prismic document search API allows
+SEARCH_PAGE_SIZE = 100
+
+# Connection pool shared by all requests to a single host
+DEFAULT_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+
 class WordPressToPrismicMigrator:
-    def __init__(self):
+    def __init__(self, max_in_flight: int = 4, rates: Dict[str, float] = None, max_rate_limit_retries: int = 5,
+                 pool_limits: httpx.Limits = None, http2: bool = False, asset_cache_path: str = 'asset_cache.sqlite3',
+                 uid_index_path: str = 'uid_index.json', journal_path: str = 'migration_journal.jsonl',
+                 fingerprints_path: str = 'post_fingerprints.sqlite3', image_optimizer: ImageOptimizer = None,
+                 shard: Shard = None, export_index: WxrIndex = None, retry_policy: RetryPolicy = None,
+                 circuit_threshold: int = 5, circuit_reset: float = 10.0, dead_letter_path: str = 'dead_letters.jsonl',
+                 transform_cache_path: str = 'transform_cache.sqlite3', transform_cache_bytes: int = DEFAULT_MAX_BYTES,
+                 link_map: LinkMap = None, validator: DocumentValidator = None, verbose: bool = False):
         self.repository_name = os.getenv('PRISMIC_REPOSITORY_NAME')
         self.api_token = os.getenv('PRISMIC_ACCESS_TOKEN')
         self.api_key = os.getenv('PRISMIC_MIGRATION_API_KEY')
-        self.migration_url = "https://migration.prismic.io/documents"
-        self.api_url = f"https://{self.repository_name}.cdn.prismic.io/api/v2"
-        self.asset_upload_url = "https://asset-api.prismic.io/assets"
+        # Overridable so the migration can run against a local stand-in (see fake_prismic.py)
+        self.migration_url = os.getenv('PRISMIC_MIGRATION_URL', "https://migration.prismic.io/documents")
+        self.api_url = os.getenv('PRISMIC_API_URL', f"https://{self.repository_name}.cdn.prismic.io/api/v2")
+        self.asset_upload_url = os.getenv('PRISMIC_ASSET_URL', "https://asset-api.prismic.io/assets")
+        # Caps concurrent requests to Prismic across all pipeline stages
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        # Only this shard's posts and attachments are migrated; None migrates everything
+        self.shard = shard
+        rates = {**DEFAULT_RATES, **(rates or {})}
+        if shard:
+            # Every shard gets an equal slice of the rates, so all of them together stay under the global limit
+            rates = {endpoint: rate / shard[1] for endpoint, rate in rates.items()}
+        # One adaptive token bucket per Prismic endpoint, shared by every request
+        self.rate_limiter = RateLimiter(rates)
+        self.max_rate_limit_retries = max_rate_limit_retries
+        # Timeouts, dropped connections and 5xx are retried with backoff; a circuit breaker per endpoint
+        # (created by breaker_for()) pauses every worker while a service keeps failing
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_threshold = circuit_threshold
+        self.circuit_reset = circuit_reset
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Documents and images that failed for good, replayable with replay_dead_letters(); None only logs them
+        self.dead_letters = DeadLetterQueue(dead_letter_path) if dead_letter_path else None
+        # Whether each image that failed to upload this run might still succeed later, by URL
+        self.failed_assets: Dict[str, bool] = {}
+        # One pooled keep-alive client per host, created lazily by client_for()
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.pool_limits = pool_limits or DEFAULT_POOL_LIMITS
+        self.http2 = http2 and HTTP2_AVAILABLE
+        if http2 and not HTTP2_AVAILABLE:
+            print("HTTP/2 requested but the 'h2' package is not installed; falling back to HTTP/1.1")
+        # Uploaded images, remembered across posts and runs; None disables the cache
+        self.asset_cache = AssetCache(asset_cache_path) if asset_cache_path else None
+        self.pending_uploads: Dict[str, asyncio.Future] = {}
+        # Downscales and recompresses images between download and upload; None uploads originals
+        self.image_optimizer = image_optimizer
+        # Asset IDs of the export's attachments by media_key(), filled by preupload_attachments()
+        self.asset_map: Dict[str, str] = {}
+        # Hosts the export's own uploads are served from; media_key() only ignores the host for these
+        self.site_hosts: Set[str] = set()
+        # Byte offsets of the export's items (see wxr_index.py), so posts are read with a seek each; None parses the whole export
+        self.export_index = export_index
+        # UIDs already published in Prismic, refreshed incrementally by get_current_posts()
+        self.uid_index = UidIndex(uid_index_path)
+        # Per-post progress, used by --resume to skip finished work after a crash
+        self.journal = MigrationJournal(journal_path) if journal_path else None
+        # What each post looked like when last sent, compared against in delta runs
+        self.fingerprints = FingerprintStore(fingerprints_path) if fingerprints_path else None
+        # Converted documents of posts seen before, so unchanged posts skip conversion; None converts every post
+        self.transform_cache = TransformCache(transform_cache_path, transform_cache_bytes) if transform_cache_path else None
+        # The export's posts by every URL that links to them, so links between posts become Document links; None keeps Web links
+        self.link_map = link_map
+        # Checks converted documents against the custom type models, so invalid ones never reach Prismic; None sends them unchecked
+        self.validator = validator
+        # Worker processes for HTML conversion, alive for the duration of migrate_to_prismic()
+        self.transform_pool: ProcessPoolExecutor = None
+        # Counters and latency histograms for every stage; per-post output and payload dumps only when verbose
+        self.metrics = Metrics()
+        self.verbose = verbose
+        
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """Return the long-lived client for a URL's host, creating it on first use."""
+        host = urlparse(url).netloc
+        client = self.clients.get(host)
+        if client is None:
+            client = httpx.AsyncClient(limits=self.pool_limits, http2=self.http2, follow_redirects=True)
+            self.clients[host] = client
+        return client
+    
+    async def aclose(self) -> None:
+        """Close every pooled client."""
+        clients, self.clients = self.clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
+        if self.journal:
+            self.journal.close()
+        if self.fingerprints:
+            self.fingerprints.close()
+        if self.asset_cache:
+            self.asset_cache.close()
+        if self.image_optimizer:
+            self.image_optimizer.close()
+        if self.export_index is not None:
+            self.export_index.close()
+        if self.dead_letters:
+            self.dead_letters.close()
+        if self.transform_cache is not None:
+            self.transform_cache.close()
+    
+    async def __aenter__(self) -> 'WordPressToPrismicMigrator':
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+        
+    def breaker_for(self, endpoint: str) -> CircuitBreaker:
+        """Return the circuit breaker shared by every request to an endpoint, creating it on first use."""
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(self.circuit_threshold, self.circuit_reset)
+            self.metrics.gauge('circuit_open', lambda: int(breaker.state != CLOSED), endpoint=endpoint)
+        return breaker
+
+    def record_failure(self, endpoint: str) -> None:
+        """Count a failed request against the endpoint's circuit breaker."""
+        breaker = self.breaker_for(endpoint)
+        if breaker.failed():
+            self.metrics.count('circuits_opened_total', endpoint=endpoint)
+            print(f"{endpoint} keeps failing; pausing its requests for {breaker.reset_timeout:.0f} seconds")
+
+    async def backoff(self, endpoint: str, retry: int, reason: str) -> None:
+        """Wait before retrying a failed request, longer after each retry."""
+        delay = self.retry_policy.delay(retry)
+        self.metrics.count('retries_total', endpoint=endpoint, reason=reason)
+        if self.verbose:
+            print(f"Request to {endpoint} failed ({reason}), retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+
+    async def request(self, endpoint: str, method: str, url: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+        """Send a request through the endpoint's rate limiter and circuit breaker, retrying what may succeed later.
+
+        429s are retried as soon as the rate limiter lets requests through
+        again; timeouts, dropped connections and 5xx responses are retried
+        with jittered exponential backoff. Once retries run out, the last
+        response is returned or the last transport error raised.
+
+        Requests that are not `idempotent`, like creating a document, may
+        have taken effect even though their response was lost, so they are
+        only retried after a 429 or when they never reached the server.
+        """
+        client = self.client_for(url)
+        breaker = self.breaker_for(endpoint)
+        rate_limited = failures = 0
+        while True:
+            await breaker.wait()
+            await self.rate_limiter.acquire(endpoint)
+            try:
+                async with self.in_flight:
+                    with self.metrics.timer('request_seconds', endpoint=endpoint):
+                        response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self.metrics.count('requests_total', endpoint=endpoint, status=type(e).__name__)
+                self.record_failure(endpoint)
+                failures += 1
+                if failures >= self.retry_policy.max_attempts or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                    raise
+                await self.backoff(endpoint, failures - 1, type(e).__name__)
+                continue
+            self.metrics.count('requests_total', endpoint=endpoint, status=response.status_code)
+            
+            delay = self.rate_limiter.observe(endpoint, response)
+            if delay is not None:
+                # Busy rather than failing: the rate limiter already holds every caller back
+                breaker.succeeded()
+                if rate_limited == self.max_rate_limit_retries:
+                    return response
+                rate_limited += 1
+                self.metrics.count('retries_total', endpoint=endpoint, reason='429')
+                if self.verbose:
+                    print(f"Rate limit hit on {endpoint}, retrying in {delay:.1f} seconds...")
+                continue
+            
+            if not is_retryable(status_code=response.status_code):
+                breaker.succeeded()
+                return response
+            self.record_failure(endpoint)
+            failures += 1
+            if failures >= self.retry_policy.max_attempts or not idempotent:
+                return response
+            await self.backoff(endpoint, failures - 1, str(response.status_code))
+        
+    def dead_letter(self, kind: str, key: str, error: BaseException|str, retryable: bool = None, **payload: Any) -> None:
+        """Record an item that failed for good, so it can be replayed later.
+
+        Whether replaying it may help is worked out from `error` unless `retryable` says so.
+        """
+        if retryable is None:
+            retryable = isinstance(error, BaseException) and is_retryable(error)
+        reason = describe_error(error) if isinstance(error, BaseException) else error
+        self.metrics.count('dead_letters_total', kind=kind, retryable=str(retryable).lower())
+        if kind == 'asset':
+            self.failed_assets[key] = retryable
+        if self.dead_letters:
+            self.dead_letters.add(kind, key, reason, retryable, **payload)
+    
+    def resolve_dead_letter(self, kind: str, key: str) -> None:
+        """Clear an item's dead letter once it went through, in whatever run that happened."""
+        if kind == 'asset':
+            self.failed_assets.pop(key, None)
+        if self.dead_letters:
+            self.dead_letters.resolve(kind, key)
         
     async def get_master_ref(self) -> str:
         """Get the master ref from Prismic API."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.api_url)
-            if response.status_code != 200:
-                print(f"Error getting master ref. Status: {response.status_code}")
-                print(f"Response: {response.text}")
-                return None
-                
-            try:
-                data = response.json()
-                master_ref = next(ref['ref'] for ref in data['refs'] if ref['isMasterRef'])
-                return master_ref
-            except Exception as e:
-                print(f"Error parsing master ref response: {str(e)}")
-                return None
+        response = await self.request('cdn', 'GET', self.api_url)
+        if response.status_code != 200:
+            print(f"Error getting master ref. Status: {response.status_code}")
+            print(f"Response: {response.text}")
+            return None
+            
+        try:
+            data = response.json()
+            master_ref = next(ref['ref'] for ref in data['refs'] if ref['isMasterRef'])
+            return master_ref
+        except Exception as e:
+            print(f"Error parsing master ref response: {str(e)}")
+            return None
+
+    async def fetch_posts_page(self, master_ref: str, query: str, page: int) -> Dict[str, Any]:
+        """Fetch one page of post search results, with only the fields the UID index needs."""
+        params = {
+            'ref': master_ref,
+            'q': query,
+            'pageSize': SEARCH_PAGE_SIZE,
+            'page': page,
+            # Metadata (id, uid, last_publication_date) is always returned; keep the document data minimal
+            'fetch': 'post.title',
+        }
+        
+        response = await self.request('cdn', 'GET', f"{self.api_url}/documents/search", params=params)
+        if response.status_code != 200:
+            raise RuntimeError(f"Error fetching page {page} of posts ({response.status_code}): {response.text[:500]}")
+        return response.json()
 
-    async def get_current_posts(self) -> List[Dict[str, Any]]:
-        """Fetch all existing posts from Prismic."""
+    async def get_current_posts(self, full_refresh: bool = False) -> List[Dict[str, Any]]:
+        """Fetch all existing posts from Prismic into the local UID index.
+
+        The first page reports `total_pages`; the remaining pages are then
+        fetched concurrently. When the index was already populated by an
+        earlier run, only documents published since then are requested,
+        unless `full_refresh` is set (e.g. after documents were deleted).
+        """
         print("\nFetching current posts from Prismic...")
         
-        async with httpx.AsyncClient() as client:
-            try:
-                # Get the master ref
-                master_ref = await self.get_master_ref()
-                if not master_ref:
-                    print("Could not get master ref")
-                    return []
-                
-                # Query for all posts
-                query_url = f"{self.api_url}/documents/search"
-                params = {
-                    'ref': master_ref,
-                    'q': '[[at(document.type,"post")]]'
-                }
-                
-                response = await client.get(query_url, params=params)
-                print(f"API Response Status: {response.status_code}")
-                print(f"API Response Headers: {dict(response.headers)}")
-                
-                if response.status_code != 200:
-                    print(f"Error fetching posts. Response: {response.text}")
-                    return []
-                
-                try:
-                    data = response.json()
-                except json.JSONDecodeError as e:
-                    print(f"Error decoding JSON response: {str(e)}")
-                    print(f"Raw response: {response.text[:500]}...")
-                    return []
+        try:
+            # Get the master ref
+            master_ref = await self.get_master_ref()
+            if not master_ref:
+                print("Could not get master ref")
+                return self.uid_index.as_posts()
+            
+            query = '[at(document.type,"post")]'
+            if full_refresh:
+                self.uid_index.clear()
+            elif self.uid_index.last_publication_date:
+                # Overlap by a second so documents published in the same instant aren't missed
+                since = publication_timestamp(self.uid_index.last_publication_date) - 1000
+                query += f'[date.after(document.last_publication_date,{since})]'
+                print(f"Refreshing UID index with posts published since {self.uid_index.last_publication_date}")
+            query = f'[{query}]'
+            
+            first_page = await self.fetch_posts_page(master_ref, query, 1)
+            self.uid_index.update(first_page['results'])
+            
+            total_pages = first_page.get('total_pages', 1)
+            pages = await asyncio.gather(*(
+                self.fetch_posts_page(master_ref, query, page) for page in range(2, total_pages + 1)
+            ))
+            for page in pages:
+                self.uid_index.update(page['results'])
+            
+            self.uid_index.save()
+            print(f"Fetched {first_page.get('total_results_size', 0)} posts in {total_pages} pages; "
+                  f"{len(self.uid_index)} posts known in Prismic")
                 
-                if data.get('results_size', 0) > 0:
-                    print(f"\nFound {data['results_size']} existing posts in Prismic:")
-                    for post in data['results']:
-                        title = post.get('data', {}).get('title', [{}])[0].get('text', 'No title')
-                        print(f"- {post['uid']}: {title}")
-                    return data['results']
-                else:
-                    print("No existing posts found in Prismic")
-                    return []
-                    
-            except Exception as e:
-                print(f"Error fetching current posts: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return []
+        except Exception as e:
+            print(f"Error fetching current posts: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        
+        return self.uid_index.as_posts()
 
-    def parse_wordpress_xml(self, xml_path: str) -> List[Dict[str, Any]]:
-        """Parse WordPress XML export file and extract posts."""
+    def iter_wordpress_posts(self, xml_path: str, start: int = None, stop: int = None,
+                             only: Iterable[str] = ()) -> Iterator[Dict[str, Any]]:
+        """Stream published posts out of a WordPress XML export, one <item> at a time.
+
+        `start` and `stop` select a slice of the export's items (not just posts),
+        which is handy for trying the migration out on a handful of entries.
+        `only` restricts the run to the posts with these IDs or slugs; it
+        requires the export index.
+        """
         print(f"\nParsing WordPress XML file: {xml_path}")
+        if self.export_index is not None:
+            yield from self.iter_indexed_posts(start, stop, only)
+            return
+        if only:
+            raise ValueError('Selecting posts by ID or slug requires an index of the export (see wxr_index.py)')
         
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            
-            namespaces = {
-                'content': 'http://purl.org/rss/1.0/modules/content/',
-                'wp': 'http://wordpress.org/export/1.2/',
-                'excerpt': 'http://wordpress.org/export/1.2/excerpt/',
-            }
-            
-            posts = []
-            for item in list(root.findall('.//item'))[2:3]:
-                post_type = item.find('wp:post_type', namespaces)
-                status = item.find('wp:status', namespaces)
+            with open(xml_path, 'rb') as f:
+                # How far into the file the parser is drives the progress line's ETA
+                self.metrics.gauge('export_bytes_total', os.fstat(f.fileno()).st_size)
+                self.metrics.gauge('export_bytes_read', f.tell)
                 
-                if (post_type is not None and post_type.text == 'post' and 
-                    status is not None and status.text == 'publish'):
-                    
-                    content = item.find('content:encoded', namespaces)
-                    title = item.find('title')
-                    pub_date = item.find('pubDate')
-                    post_name = item.find('wp:post_name', namespaces)
+                try:
+                    parse_start = time.perf_counter()
+                    for item in islice(iter_items(f), start, stop):
+                        if self.shard and not in_shard(item_text(item, 'wp:post_id'), self.shard):
+                            parse_start = time.perf_counter()
+                            continue
+                        post_data = parse_item(item)
+                        # Includes reading the item off disk, which the parser does lazily
+                        self.metrics.observe('parse_seconds', time.perf_counter() - parse_start)
+                        self.metrics.count('items_parsed_total', post_type=post_data['post_type'])
+                        
+                        if post_data['post_type'] == 'post' and post_data['status'] == 'publish':
+                            if self.verbose:
+                                print(f"Found post: {post_data['title']}")
+                            yield post_data
+                        parse_start = time.perf_counter()
+                finally:
+                    self.metrics.gauge('export_bytes_read', f.tell())
                     
-                    post_data = {
-                        'title': title.text if title is not None else '',
-                        'content': content.text if content is not None else '',
-                        'publication_date': pub_date.text if pub_date is not None else '',
-                        'uid': post_name.text if post_name is not None else ''
-                    }
-                    posts.append(post_data)
-                    print(f"Found post: {post_data['title']}")
-            
-            return posts
-            
         except Exception as e:
             print(f"Error parsing WordPress XML: {str(e)}")
             import traceback
             traceback.print_exc()
-            return []
+
+    def iter_indexed_posts(self, start: int = None, stop: int = None, only: Iterable[str] = ()) -> Iterator[Dict[str, Any]]:
+        """Like iter_wordpress_posts(), but only the published posts are read, each with a seek, found in the export index."""
+        only = list(only)
+        filters = {'post_types': ['post'], 'statuses': ['publish'], 'start': start, 'stop': stop}
+        if only:
+            # A post may be named by its ID or by its slug
+            entries = {entry['position']: entry for entry in self.export_index.select(post_ids=only, **filters)}
+            entries.update((entry['position'], entry) for entry in self.export_index.select(post_names=only, **filters))
+            entries = [entries[position] for position in sorted(entries)]
+            print(f"{len(entries)} of {len(only)} selected posts found in the export")
+        else:
+            entries = self.export_index.select(**filters)
+        
+        self.metrics.gauge('export_bytes_total', os.path.getsize(self.export_index.xml_path))
+        for entry in entries:
+            if self.shard and not in_shard(entry['post_id'], self.shard):
+                continue
+            parse_start = time.perf_counter()
+            post_data = parse_item(self.export_index.read(entry))
+            self.metrics.observe('parse_seconds', time.perf_counter() - parse_start)
+            self.metrics.count('items_parsed_total', post_type=post_data['post_type'])
+            self.metrics.gauge('export_bytes_read', entry['offset'] + entry['length'])
+            
+            if self.verbose:
+                print(f"Found post: {post_data['title']}")
+            yield post_data
+
+    def iter_attachments(self, xml_path: str) -> Iterator[Tuple[str, str]]:
+        """Stream the post ID and media URL of every attachment item in a WordPress export."""
+        if self.export_index is not None:
+            # The index has the URLs already; no need to read the export at all
+            for entry in self.export_index.select(post_types=['attachment']):
+                if entry['attachment_url']:
+                    yield entry['post_id'], entry['attachment_url']
+            return
+        try:
+            for item in iter_items(xml_path):
+                if item_text(item, 'wp:post_type') == 'attachment':
+                    url = item_text(item, 'wp:attachment_url')
+                    if url:
+                        yield item_text(item, 'wp:post_id'), url
+        except Exception as e:
+            print(f"Error parsing WordPress XML: {str(e)}")
+
+    async def preupload_attachments(self, xml_path: str, workers: int = 8, queue_size: int = 64) -> int:
+        """Upload every attachment listed in the export up front, `workers` at a time.
+
+        Fills `asset_map`, from which documents then resolve their images
+        without any network call. Attachments uploaded by an earlier run are
+        found in the asset cache. Returns the number of attachments mapped.
+
+        When sharded, each shard only uploads its own attachments and maps
+        the others from the shared asset cache, as far as their shards have
+        uploaded them already.
+        """
+        print(f"\nUploading attachments from {xml_path}...")
+        if not os.path.exists(xml_path):
+            print(f"Error parsing WordPress XML: {xml_path} does not exist")
+            return 0
+        self.site_hosts.update(export_site_hosts(xml_path))
+        
+        async def upload(attachment: Tuple[str, str]) -> None:
+            post_id, url = attachment
+            # Whatever host the media library is served from is ours too
+            self.site_hosts.add(site_host(url))
+            if self.shard and not in_shard(post_id, self.shard):
+                asset_id = self.asset_cache.get_by_url(url) if self.asset_cache else None
+            else:
+                asset_id = await self.upload_image_asset(url)
+            if asset_id:
+                self.asset_map[media_key(url, self.site_hosts)] = asset_id
+        
+        await run_pipeline(self.iter_attachments(xml_path), [Stage('preupload', upload, workers, queue_size)])
+        print(f"{len(self.asset_map)} attachments available in Prismic")
+        return len(self.asset_map)
+
+    def parse_wordpress_xml(self, xml_path: str, start: int = None, stop: int = None) -> List[Dict[str, Any]]:
+        """Parse WordPress XML export file and extract posts."""
+        return list(self.iter_wordpress_posts(xml_path, start, stop))
       
     async def upload_image_asset(self, url: str) -> str|bool:
+        """Return the Prismic asset ID for an image, uploading it only if it was never uploaded before."""
+        if self.asset_cache:
+            asset_id = self.asset_cache.get_by_url(url)
+            if asset_id:
+                return asset_id
+        
+        # Posts processed concurrently may reference the same image; share a single upload
+        upload = self.pending_uploads.get(url)
+        if upload is None:
+            upload = asyncio.ensure_future(self._upload_image_asset(url))
+            self.pending_uploads[url] = upload
+            upload.add_done_callback(lambda _: self.pending_uploads.pop(url, None))
+        return await asyncio.shield(upload)
+    
+    async def download_asset(self, url: str) -> Tuple[IO[bytes], str, int, str, str]:
+        """Stream an image to a temporary file, hashing it on the way, so no upload ever holds a whole file in memory.
+
+        Returns the file, its SHA-256, size, filename and content type.
+        Failures are retried like Prismic requests, behind a circuit breaker
+        shared by every media download.
+        """
+        breaker = self.breaker_for('media')
+        for attempt in range(self.retry_policy.max_attempts):
+            await breaker.wait()
+            try:
+                with self.metrics.timer('asset_download_seconds'):
+                    async with self.client_for(url).stream('GET', url, timeout=30.0) as image_response:
+                        image_response.raise_for_status()
+                        spool, sha256, size = await spool_download(image_response)
+                        filename = asset_filename(url, image_response)
+                        content_type = asset_content_type(image_response, filename)
+                breaker.succeeded()
+                return spool, sha256, size, filename, content_type
+            except httpx.HTTPError as e:
+                if not is_retryable(e):
+                    # The media host is fine, this URL isn't
+                    breaker.succeeded()
+                    raise
+                self.record_failure('media')
+                if attempt + 1 == self.retry_policy.max_attempts:
+                    raise
+                reason = str(e.response.status_code) if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+                await self.backoff('media', attempt, reason)
+    
+    async def _upload_image_asset(self, url: str) -> str|bool:
         headers = {
             'Authorization': f'Bearer {self.api_token}',
             'x-api-key': self.api_key,
             'repository': self.repository_name,
-            "Content-Type": "multipart/form-data",
             "Accept": "application/json",
         }
         
         try:
-            # Download image using requests
-            image_response = requests.get(url)
-            if image_response.status_code != 200:
-                print(f"Failed to download image. Status code: {image_response.status_code}")
-                return False
+            spool, sha256, size, filename, content_type = await self.download_asset(url)
+            self.metrics.count('asset_download_bytes_total', size)
+        except Exception as e:
+            self.metrics.count('asset_failures_total', reason='download')
+            print(f"Error fetching image {url}: {describe_error(e)}")
+            self.dead_letter('asset', url, e)
+            return False
+        
+        with contextlib.ExitStack() as files:
+            files.enter_context(spool)
+            # The same file is often served from several URLs (http/https, CDN mirrors)
+            if self.asset_cache:
+                asset_id = self.asset_cache.get_by_hash(sha256)
+                if asset_id:
+                    self.asset_cache.add(url, sha256)
+                    self.metrics.count('assets_deduplicated_total')
+                    self.resolve_dead_letter('asset', url)
+                    return asset_id
+            
+            # Optimized copies are cached by the source's hash, which stays the key for deduplication
+            upload_file, upload_size = spool, size
+            if self.image_optimizer:
+                with self.metrics.timer('image_optimize_seconds'):
+                    optimized_path = await self.image_optimizer.optimize(spool.name, sha256, content_type)
+                if optimized_path:
+                    upload_file = files.enter_context(open(optimized_path, 'rb'))
+                    upload_size = os.fstat(upload_file.fileno()).st_size
+                    self.metrics.count('image_bytes_saved_total', size - upload_size)
             
-            # Prepare the image for uploading
-            files = {
-                'file': ('image.jpg', image_response.content, 'image/jpeg')  # Name and MIME type
-            }
+            # Stream the file back out as the multipart body, one chunk at a time
+            body = MultipartFileStream(upload_file, upload_size, filename, content_type)
 
-            # Use httpx to upload the image asynchronously
-            async with httpx.AsyncClient() as client:
-                try:
-                    await asyncio.sleep(2)  # Add rate limiting
-                    response = await client.post(
+            try:
+                with self.metrics.timer('asset_upload_seconds'):
+                    response = await self.request(
+                        'asset',
+                        'POST',
                         self.asset_upload_url,
-                        files=files,
-                        headers=headers,
+                        content=body,
+                        headers={**headers, **body.headers},
                         timeout=30.0
                     )
-                    response.raise_for_status()  # Will raise an HTTPError if response is not 2xx
-
-                    if response.status_code == 201:
-                        asset_data = response.json()
-                        asset_id = asset_data['id']
-                        print(f'Uploaded asset ID: {asset_id}')
-                        return asset_id
-                    else:
-                        print(f'Error: {response.status_code} - {response.text}')
-                        return False
-                except httpx.HTTPError as e:
-                    print(f"✗ Failed to upload image {url}: {str(e)}")
-                    if hasattr(e.response, 'text'):
-                        print(f"Error details: {e.response.text}")
-                    
-                    if getattr(e.response, 'status_code', None) == 429:
-                        wait_time = 10  # Adjust wait time based on your needs
-                        print(f"Rate limit hit, waiting {wait_time} seconds...")
-                        await asyncio.sleep(wait_time)
-                except Exception as e:
-                    print(f"✗ Unexpected error while uploading image {url}: {str(e)}")
-        except Exception as e:
-            print(f"Error fetching image: {str(e)}")
-            return False  
-    def strip_double_slashes(self, string: str) -> str:
-        return string.replace('"\\', '').replace('\\"', '')
-    
-    async def html_to_prismic_richtext(self, html_content: str) -> List[Dict[str, Any]]:
-        """Convert HTML content to Prismic Rich Text format, handling inline captions."""
-        if not html_content:
-            return []
+                response.raise_for_status()  # Will raise an HTTPError if response is not 2xx
 
-        try:
-            # Regex to capture [caption] blocks, including nested HTML content
-            caption_regex = r"\[caption[^\]]*\](.*?)\[/caption\]"
+                if response.status_code == 201:
+                    asset_data = response.json()
+                    asset_id = asset_data['id']
+                    self.metrics.count('assets_uploaded_total')
+                    if self.verbose:
+                        print(f'Uploaded asset ID: {asset_id} ({filename}, {content_type})')
+                    if self.asset_cache:
+                        self.asset_cache.add(url, sha256, asset_id)
+                    self.resolve_dead_letter('asset', url)
+                    return asset_id
+                else:
+                    print(f'Error: {response.status_code} - {response.text}')
+                    self.metrics.count('asset_failures_total', reason='upload')
+                    self.dead_letter('asset', url, f'unexpected status {response.status_code}')
+                    return False
+            except httpx.HTTPError as e:
+                self.metrics.count('asset_failures_total', reason='upload')
+                print(f"✗ Failed to upload image {url}: {str(e)}")
+                if isinstance(e, httpx.HTTPStatusError):
+                    print(f"Error details: {e.response.text}")
+                self.dead_letter('asset', url, e)
+            except Exception as e:
+                self.metrics.count('asset_failures_total', reason='upload')
+                print(f"✗ Unexpected error while uploading image {url}: {str(e)}")
+                self.dead_letter('asset', url, e)
+            return False
 
-            paragraphs = []
-            for paragraph in html_content.split("\n\n"):
-                paragraph = paragraph.strip()
-                if not paragraph:
-                    continue
+    def html_to_prismic_richtext(self, html_content: str) -> List[Dict[str, Any]]:
+        """Convert HTML content to Prismic Rich Text format, handling inline captions."""
+        return transform.html_to_prismic_richtext(html_content)
+        
+    def create_prismic_document(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        """Transform WordPress post into Prismic document format."""
+        return transform.create_prismic_document(post)
 
-                # Detect and process captions
-                caption_match = re.search(caption_regex, paragraph, re.DOTALL)
+    async def create_prismic_documents(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Transform a chunk of posts, in the process pool when there is one.
 
-                if caption_match:
-                    caption_html = caption_match.group(1)  # Entire HTML content inside [caption]
-                    soup_caption = BeautifulSoup(caption_html, "html.parser")
-                    
-                    print(f"{caption_html}")
-                    # Extract the image tag
-                    image_tag = soup_caption.find("img")
-                    if image_tag:
-                        image_url = self.strip_double_slashes(image_tag.get("src", ""))
-                        image_alt = self.strip_double_slashes(image_tag.get("alt", ""))
-                        image_title = self.strip_double_slashes(image_tag.get("title", ""))
-                        caption_text = soup_caption.get_text(strip=True).replace(
-                            image_tag.get_text(strip=True), ""
-                        ).strip()
-                        
-                        image_id = await self.upload_image_asset(image_url)
-                        
-                        if(image_id):
-                            # Add caption and inline image
-                            paragraphs.append({
-                                "id": self.upload_image_asset(image_url),
-                                "type": "image",
-                                "url": image_url,
-                                "alt": image_alt,
-                                "title": image_title,
-                                "caption": caption_text
-                            })
-                    continue  # Skip to the next paragraph
-
-                # Regular text paragraph
-                paragraphs.append({
-                    "type": "paragraph",
-                    "text": paragraph,
-                    "spans": [],
-                    "direction": "ltr"
-                })
-
-            return paragraphs
-        except Exception as e:
-            print(f"Error converting HTML to rich text: {str(e)}")
-            return []
+        Posts whose content was converted before (by their `sha256`
+        fingerprint) come out of the transform cache instead.
+        """
+        cached = {}
+        if self.transform_cache is not None:
+            cached = self.transform_cache.get_many(post['sha256'] for post in posts if post.get('sha256'))
+            self.metrics.count('transform_cache_total', len(cached), result='hit')
+            self.metrics.count('transform_cache_total', len(posts) - len(cached), result='miss')
+        missing = [post for post in posts if post.get('sha256') not in cached]
+        converted = iter(await self.convert_posts(missing) if missing else [])
         
-    async def create_prismic_document(self, post: Dict[str, Any]) -> Dict[str, Any]:
-        """Transform WordPress post into Prismic document format."""
-        try:
-            uid = post['uid'] or re.sub(r'[^a-z0-9-]', '', post['title'].lower().replace(' ', '-'))
-            uid = uid[:150]  # Ensure UID isn't too long
-            
-            try:
-                pub_date = datetime.strptime(
-                    post['publication_date'],
-                    '%a, %d %b %Y %H:%M:%S %z'
-                ).strftime('%Y-%m-%d')
-            except:
-                pub_date = datetime.now().strftime('%Y-%m-%d')
-            
-            return {
-                'title': post['title'],
-                'uid': uid,
-                'type': 'post',
-                'lang': 'en-us',
-                'data': {
-                    'title': [{
-                        'type': 'paragraph',
-                        'text': post['title'],
-                        'spans': [],
-                        'direction': 'ltr'
-                    }],
-                    'published_date': pub_date,
-                    'body': await self.html_to_prismic_richtext(post['content']),
-                    # 'author': {
-                    #     'link_type': 'Any',
-                    #     'text': 'AWP Network'
-                    # },
-                    'slices': []
-                }
-            }
-        except Exception as e:
-            print(f"Error creating Prismic document: {str(e)}")
+        documents = [cached.get(post.get('sha256')) or next(converted) for post in posts]
+        if self.transform_cache is not None:
+            self.transform_cache.put_many([(post['sha256'], document) for post, document in zip(posts, documents)
+                                           if document and post.get('sha256') and post['sha256'] not in cached])
+        return documents
+
+    async def convert_posts(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run the HTML conversion of a chunk of posts."""
+        start = time.perf_counter()
+        if self.transform_pool is None:
+            documents = transform.create_prismic_documents(posts)
+        else:
+            loop = asyncio.get_running_loop()
+            documents = await loop.run_in_executor(self.transform_pool, transform.create_prismic_documents, posts)
+        
+        # Chunks are converted as a whole; attribute an equal share of the time to each post
+        per_post = (time.perf_counter() - start) / max(1, len(posts))
+        for _ in posts:
+            self.metrics.observe('convert_seconds', per_post)
+        return documents
+
+    async def upload_document_assets(self, prismic_doc: Dict[str, Any], document_id: str = None) -> Dict[str, Any]|None:
+        """Upload every image referenced by a document and fill in the asset IDs.
+
+        Images that can never be uploaded (e.g. a 404) are dropped from the
+        body. When an image still failed after every retry, the document is
+        dead-lettered instead, to be sent with all its images on replay, and
+        None is returned; `document_id` is the document it would have updated.
+        Asset IDs the journal already holds for this post,
+        or that were pre-uploaded as attachments, are reused without any
+        network call.
+        """
+        body = prismic_doc['data']['body']
+        images = [block for block in body if block['type'] == 'image']
+        if not images:
+            return prismic_doc
+
+        journaled = self.journal.asset_ids(prismic_doc['uid']) if self.journal else {}
+
+        async def resolve(url: str) -> str|bool:
+            return journaled.get(url) or self.asset_map.get(media_key(url, self.site_hosts)) or await self.upload_image_asset(url)
+
+        asset_ids = await asyncio.gather(*(resolve(block['url']) for block in images))
+        retryable = [block['url'] for block, asset_id in zip(images, asset_ids)
+                     if not asset_id and self.failed_assets.get(block['url'])]
+        if retryable:
+            reason = f"{len(retryable)} images failed to upload: {', '.join(retryable)}"
+            print(f"✗ Deferring {prismic_doc['title']}: {reason}")
+            if self.journal:
+                self.journal.record(prismic_doc['uid'], FAILED, reason=reason)
+            self.dead_letter('document', prismic_doc['uid'], reason, retryable=True, document=prismic_doc,
+                             document_id=document_id)
             return None
+        
+        for block, asset_id in zip(images, asset_ids):
+            block['id'] = asset_id
+
+        prismic_doc['data']['body'] = [block for block in body if block['type'] != 'image' or block['id']]
+        if self.journal:
+            assets = {block['url']: block['id'] for block in images if block['id']}
+            self.journal.record(prismic_doc['uid'], ASSETS_UPLOADED, assets=assets)
+        return prismic_doc
+
+    async def send_prismic_document(self, prismic_doc: Dict[str, Any], document_id: str = None) -> str|None:
+        """Create a single document via the Migration API and return its ID.
 
-    async def migrate_to_prismic(self, posts: List[Dict[str, Any]], existing_posts: List[Dict[str, Any]]) -> None:
-        """Migrate posts to Prismic via the Migration API."""
+        When `document_id` is given, that existing document is updated instead.
+        """
         headers = {
             'Authorization': f'Bearer {self.api_token}',
             'repository': self.repository_name,
@@ -300,77 +684,621 @@ class WordPressToPrismicMigrator:
             'Content-Type': 'application/json'
         }
         
-        existing_uids = {post['uid'] for post in existing_posts}
+        if self.verbose:
+            print(f"\nProcessing post: {prismic_doc['title']}")
+            print(f"Document to be sent:\n{json.dumps(prismic_doc, indent=2)}")
         
-        async with httpx.AsyncClient() as client:
-            for i, post in enumerate(posts, 1):
-                prismic_doc = await self.create_prismic_document(post)
-                if not prismic_doc:
-                    print(f"\nSkipping post {i}/{len(posts)}: {post['title']} (error creating document)")
-                    continue
-                
-                if prismic_doc['uid'] in existing_uids:
-                    print(f"\nSkipping post {i}/{len(posts)}: {post['title']} (already exists)")
+        start = time.perf_counter()
+        try:
+            if document_id:
+                response = await self.request(
+                    'migration',
+                    'PUT',
+                    f"{self.migration_url}/{document_id}",
+                    json=prismic_doc,
+                    headers=headers,
+                    timeout=30.0
+                )
+            else:
+                response = await self.request(
+                    'migration',
+                    'POST',
+                    self.migration_url,
+                    # A lost response may hide a created document; sending it again could create a duplicate
+                    idempotent=False,
+                    json=prismic_doc,
+                    headers=headers,
+                    timeout=30.0
+                )
+            self.metrics.observe('document_send_seconds', time.perf_counter() - start)
+            response.raise_for_status()
+            if self.verbose:
+                print(f"✓ Successfully {'updated' if document_id else 'migrated'}: {prismic_doc['title']}")
+                print(f"Response: {response.text}")
+            state = UPDATED if document_id else CREATED
+            self.metrics.count('documents_sent_total', result=state)
+            document_id = response.json().get('id') or document_id or ''
+            if self.journal:
+                self.journal.record(prismic_doc['uid'], state, document_id=document_id)
+            self.resolve_dead_letter('document', prismic_doc['uid'])
+            if self.link_map is not None and document_id:
+                # Posts sent from now on can link to this one
+                self.link_map.add_documents({prismic_doc['uid']: document_id})
+            return document_id
+            
+        except httpx.HTTPError as e:
+            print(f"✗ Failed to migrate {prismic_doc['title']}: {str(e)}")
+            if isinstance(e, httpx.HTTPStatusError):
+                print(f"Error details: {e.response.text}")
+            error = e
+        except Exception as e:
+            print(f"✗ Unexpected error while migrating {prismic_doc['title']}: {str(e)}")
+            error = e
+        
+        self.metrics.count('documents_sent_total', result=FAILED)
+        if self.journal:
+            self.journal.record(prismic_doc['uid'], FAILED, reason=str(error))
+        # A create whose response was lost or that failed server-side may still have gone through
+        maybe_created = not document_id and (
+            (isinstance(error, httpx.TransportError) and not isinstance(error, UNSENT_ERRORS))
+            or (isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500)
+        )
+        payload = {'maybe_created': True} if maybe_created else {}
+        self.dead_letter('document', prismic_doc['uid'], error, document=prismic_doc, document_id=document_id, **payload)
+        return None
+
+    async def replay_dead_letters(self, workers: int = 4) -> int:
+        """Try every dead-lettered image, then every dead-lettered document, again.
+
+        What goes through is marked resolved; what fails again is
+        dead-lettered anew. Returns how many items are still failing.
+        """
+        entries = self.dead_letters.entries()
+        self.seed_link_map()
+        print(f"\nReplaying {len(entries)} dead letters from {self.dead_letters.path}...")
+        resolved = 0
+        
+        async def replay(entry: Dict[str, Any]) -> None:
+            nonlocal resolved
+            journaled = self.journal.get(entry['key']) if self.journal and entry['kind'] == 'document' else None
+            if journaled and journaled['state'] in (CREATED, UPDATED) and journaled['time'] > entry['time']:
+                # A later run sent it; replaying would duplicate the document or overwrite newer content
+                self.dead_letters.resolve(entry['kind'], entry['key'])
+                resolved += 1
+                return
+            if entry.get('maybe_created'):
+                # Only the migration release can tell; resending blindly could create a duplicate
+                print(f"✗ Not replaying {entry['key']}: it may have been created; check the migration release "
+                      f"(check_status.py) and send it with --post if it is missing")
+                return
+            if entry['kind'] == 'asset':
+                self.failed_assets.pop(entry['key'], None)
+                succeeded = bool(await self.upload_image_asset(entry['key']))
+            else:
+                errors = self.validator.validate(entry['document']) if self.validator is not None else []
+                if errors:
+                    # Still invalid; it stays dead-lettered until the post is converted again
+                    print(f"✗ Not replaying {entry['key']}: {'; '.join(errors)}")
+                    return
+                prismic_doc = await self.upload_document_assets(entry['document'], entry.get('document_id'))
+                if prismic_doc:
+                    self.rewrite_links(prismic_doc)
+                succeeded = bool(prismic_doc) and await self.send_prismic_document(prismic_doc, entry.get('document_id')) is not None
+            if succeeded:
+                self.dead_letters.resolve(entry['kind'], entry['key'])
+                resolved += 1
+        
+        # Images first, so the documents that were waiting for them find them in the asset cache
+        for kind in ('asset', 'document'):
+            await run_pipeline((entry for entry in entries if entry['kind'] == kind), [Stage(f'replay_{kind}', replay, workers)])
+        remaining = self.dead_letters.compact()
+        print(f"Replayed {resolved} dead letters; {remaining} still failing")
+        return remaining
+
+    def find_document_id(self, post: Dict[str, Any]) -> str|None:
+        """Look up the Prismic document a WordPress post was previously sent to, without any network call."""
+        row = self.fingerprints.get(post['post_id']) if self.fingerprints else None
+        if row and row[3]:
+            return row[3]
+        entry = self.journal.get(post['uid']) if self.journal else None
+        if entry and entry.get('document_id'):
+            return entry['document_id']
+        return self.uid_index.get_id(post['uid'])
+
+    def needs_transform(self, post: Dict[str, Any], delta: bool) -> bool:
+        """Fingerprint a post and, in delta runs, tell whether it changed since it was last sent."""
+        post['sha256'] = content_fingerprint(post)
+        post['document_id'] = None
+        if delta and self.fingerprints:
+            if self.fingerprints.is_unchanged(post['post_id'], post['sha256']):
+                self.metrics.count('posts_skipped_total', reason='unchanged')
+                return False
+            post['document_id'] = self.find_document_id(post)
+        return True
+
+    async def transform_chunk(self, chunk: List[Dict[str, Any]], delta: bool) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Convert the posts of a chunk that need it; returns (post, document) pairs for those that converted."""
+        chunk = [post for post in chunk if self.needs_transform(post, delta)]
+        if not chunk:
+            return []
+        
+        items = []
+        for post, prismic_doc in zip(chunk, await self.create_prismic_documents(chunk)):
+            if not prismic_doc:
+                print(f"\nSkipping post: {post['title']} (error creating document)")
+                self.metrics.count('posts_skipped_total', reason='transform_error')
+                continue
+            if self.validator is not None:
+                errors = self.validator.validate(prismic_doc)
+                if errors:
+                    self.reject_document(post, prismic_doc, errors)
                     continue
-                
-                print(f"\nProcessing post {i}/{len(posts)}: {post['title']}")
-                print(f"Document to be sent:\n{json.dumps(prismic_doc, indent=2)}")
-                
-                try:
-                    await asyncio.sleep(2)  # Rate limiting
-                    
-                    response = await client.post(
-                        self.migration_url,
-                        json=prismic_doc,
-                        headers=headers,
-                        timeout=30.0
-                    )
-                    response.raise_for_status()
-                    print(f"✓ Successfully migrated: {post['title']}")
-                    print(f"Response: {response.text}")
-                    
-                    # Wait extra time after successful migration
-                    await asyncio.sleep(3)
-                    
-                except httpx.HTTPError as e:
-                    print(f"✗ Failed to migrate {post['title']}: {str(e)}")
-                    if hasattr(e.response, 'text'):
-                        print(f"Error details: {e.response.text}")
-                    
-                    if getattr(e.response, 'status_code', None) == 429:
-                        wait_time = 10
-                        print(f"Rate limit hit, waiting {wait_time} seconds...")
-                        await asyncio.sleep(wait_time)
-                except Exception as e:
-                    print(f"✗ Unexpected error while migrating {post['title']}: {str(e)}")
+                dead_letter = self.dead_letters.get('document', prismic_doc['uid']) if self.dead_letters else None
+                if dead_letter and dead_letter.get('invalid'):
+                    # Rejected by an earlier run, valid now that it converted again
+                    self.resolve_dead_letter('document', prismic_doc['uid'])
+            items.append((post, prismic_doc))
+        return items
+
+    def reject_document(self, post: Dict[str, Any], prismic_doc: Dict[str, Any], errors: List[str]) -> None:
+        """Keep a document that failed validation from being sent, and record why."""
+        reason = '; '.join(errors)
+        print(f"\n✗ Skipping post: {post['title']} (invalid document: {reason})")
+        self.metrics.count('posts_skipped_total', reason='invalid')
+        if self.journal:
+            self.journal.record(prismic_doc['uid'], FAILED, post_id=post.get('post_id', ''), reason=reason)
+        # Sending it again can't help; the converter or the custom type has to change first
+        self.dead_letter('document', prismic_doc['uid'], reason, retryable=False, invalid=True, document=prismic_doc,
+                         document_id=post.get('document_id'))
+
+    def should_send(self, post: Dict[str, Any], prismic_doc: Dict[str, Any], existing_ids: Dict[str, str],
+                    resume: bool, delta: bool) -> bool:
+        """Whether a converted post still has to be sent, given what Prismic and the journal already have."""
+        if delta and not post['document_id']:
+            post['document_id'] = existing_ids.get(prismic_doc['uid'])
+        elif not delta and prismic_doc['uid'] in existing_ids:
+            if self.verbose:
+                print(f"\nSkipping post: {post['title']} (already exists)")
+            self.metrics.count('posts_skipped_total', reason='exists')
+            return False
+        
+        if resume and self.journal and self.journal.is_created(prismic_doc['uid']):
+            if self.verbose:
+                print(f"\nSkipping post: {post['title']} (already migrated according to the journal)")
+            self.metrics.count('posts_skipped_total', reason='journaled')
+            return False
+        
+        if self.journal:
+            self.journal.record(prismic_doc['uid'], PARSED, post_id=post.get('post_id', ''))
+        return True
+
+    def seed_link_map(self) -> None:
+        """Give the link map the document IDs of every post already known to be in Prismic."""
+        if self.link_map is None:
+            return
+        self.link_map.add_documents({uid: doc_id for uid, (doc_id, _) in self.uid_index.documents.items() if doc_id})
+        if self.journal:
+            self.link_map.add_documents({uid: entry['document_id'] for uid, entry in self.journal.entries.items()
+                                         if entry.get('document_id') and entry['state'] in (CREATED, UPDATED)})
+
+    def rewrite_links(self, prismic_doc: Dict[str, Any]) -> int:
+        """Turn links to other migrated posts into Document links; returns how many still lack a target document."""
+        if self.link_map is None:
+            return 0
+        rewritten, unresolved = self.link_map.rewrite(prismic_doc)
+        self.metrics.count('internal_links_total', rewritten, result='rewritten')
+        self.metrics.count('internal_links_total', unresolved, result='unresolved')
+        return unresolved
+
+    def sending_stages(self, upload_workers: int, create_workers: int, queue_size: int) -> List[Stage]:
+        """The upload assets -> create document stages, fed (post, document) pairs."""
+        self.seed_link_map()
+        
+        async def upload(item: Tuple[Dict[str, Any], Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+            post, prismic_doc = item
+            prismic_doc = await self.upload_document_assets(prismic_doc, post['document_id'])
+            return (post, prismic_doc) if prismic_doc else None
+        
+        async def create(item: Tuple[Dict[str, Any], Dict[str, Any]]) -> None:
+            post, prismic_doc = item
+            # As late as possible, so links to posts sent earlier in the run resolve too
+            unresolved = self.rewrite_links(prismic_doc)
+            document_id = await self.send_prismic_document(prismic_doc, post['document_id'])
+            if document_id is not None and self.fingerprints and post['post_id']:
+                if unresolved:
+                    # Links to posts not in Prismic yet stay Web links; a blank fingerprint makes the next delta run resend this post
+                    self.fingerprints.put(post['post_id'], '', '', prismic_doc['uid'], document_id)
+                else:
+                    self.fingerprints.put(post['post_id'], post['modified_gmt'], post['sha256'], prismic_doc['uid'], document_id)
+        
+        return [
+            Stage('upload', upload, upload_workers, queue_size),
+            Stage('create', create, create_workers, queue_size),
+        ]
+
+    async def run_stages(self, source: Iterable[Any], stages: List[Stage], transform_processes: int = 0) -> None:
+        """Run a pipeline, with a transform process pool alive meanwhile unless `transform_processes` is 0."""
+        for stage in stages:
+            # Sampled at export time; a queue that stays full points at the stage after it
+            self.metrics.gauge('queue_depth', lambda stage=stage: stage.queue.qsize() if stage.queue else 0,
+                               stage=stage.name)
+        
+        if transform_processes != 0:
+            self.transform_pool = ProcessPoolExecutor(max_workers=transform_processes)
+        try:
+            await run_pipeline(source, stages)
+        finally:
+            if self.transform_pool is not None:
+                self.transform_pool.shutdown()
+                self.transform_pool = None
+
+    def transform_stage(self, transform: Any, transform_workers: int, transform_processes: int, queue_size: int) -> Stage:
+        """
+        The transform stage, with one worker per transform process unless `transform_workers` says otherwise.
+
+        Each worker awaits one chunk at a time, so fewer workers than
+        processes would leave cores idle.
+        """
+        if not transform_workers:
+            # Inline conversion blocks the event loop anyway; more workers wouldn't run any of it in parallel
+            transform_workers = 1 if transform_processes == 0 else transform_processes or os.cpu_count() or 1
+        return Stage('transform', transform, transform_workers, queue_size, fan_out=True)
+
+    def documents_sent(self) -> int:
+        return int(self.metrics.counter_value('documents_sent_total', result=CREATED)
+                   + self.metrics.counter_value('documents_sent_total', result=UPDATED))
+
+    async def migrate_to_prismic(self, posts: Iterable[Dict[str, Any]], existing_posts: List[Dict[str, Any]],
+                                 transform_workers: int = None, upload_workers: int = 4, create_workers: int = 2,
+                                 queue_size: int = 16, resume: bool = False, delta: bool = False,
+                                 transform_processes: int = None, chunk_size: int = 8) -> None:
+        """Migrate posts to Prismic via the Migration API.
+
+        Posts flow through transform -> upload assets -> create document stages,
+        each with its own workers and a bounded queue in front of it, so images
+        for the next post upload while the previous document is being created.
+        With `resume`, posts the journal already records as created are skipped.
+        With `delta`, only posts that are new or changed since they were last
+        sent are transformed, and changed posts update their existing document.
+
+        HTML conversion is CPU-bound, so posts are transformed in chunks of
+        `chunk_size` across `transform_processes` worker processes (all cores
+        by default, 0 to convert inline) and handed back to the async side.
+        `transform_workers` chunks are in flight at a time, by default one per
+        process so every core stays busy.
+        """
+        existing_ids = {post['uid']: post.get('id') for post in existing_posts}
+        sent_before = self.documents_sent()
+        
+        async def transform(chunk: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+            return [(post, prismic_doc) for post, prismic_doc in await self.transform_chunk(chunk, delta)
+                    if self.should_send(post, prismic_doc, existing_ids, resume, delta)]
+        
+        stages = [
+            self.transform_stage(transform, transform_workers, transform_processes, queue_size),
+            *self.sending_stages(upload_workers, create_workers, queue_size),
+        ]
+        await self.run_stages(batched(posts, chunk_size), stages, transform_processes)
+        
+        print(f"\nMigrated {self.documents_sent() - sent_before} posts")
+
+    async def build_staging_file(self, posts: Iterable[Dict[str, Any]], staging_path: str, transform_workers: int = None,
+                                 queue_size: int = 16, delta: bool = False, transform_processes: int = None,
+                                 chunk_size: int = 8) -> int:
+        """Convert posts into a staging file (see staging.py) without any network call; returns the documents staged.
+
+        This is the CPU-bound half of migrate_to_prismic(); send_staging_file()
+        does the rest later. With `delta`, unchanged posts are left out as
+        they would be in a delta migration.
+        """
+        print(f"\nBuilding {staging_path}...")
+        with StagingWriter(staging_path) as writer:
+            async def transform(chunk: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+                return await self.transform_chunk(chunk, delta)
+            
+            async def stage(item: Tuple[Dict[str, Any], Dict[str, Any]]) -> None:
+                post, prismic_doc = item
+                # Only what sending needs; the content itself is in the document
+                writer.append({'post': {field: post.get(field) for field in STAGED_POST_FIELDS}, 'document': prismic_doc})
+            
+            stages = [
+                self.transform_stage(transform, transform_workers, transform_processes, queue_size),
+                Stage('stage', stage, 1, queue_size),
+            ]
+            await self.run_stages(batched(posts, chunk_size), stages, transform_processes)
+        
+        print(f"Staged {len(writer)} documents in {staging_path}")
+        return len(writer)
+
+    async def validate_export(self, posts: Iterable[Dict[str, Any]], transform_workers: int = None, queue_size: int = 16,
+                              transform_processes: int = None, chunk_size: int = 8) -> Dict[str, List[str]]:
+        """Convert posts and check every document against the custom type models; returns the errors by UID.
+
+        Nothing is sent and nothing is journaled or dead-lettered, so this can
+        run any time before a migration. Documents sharing a UID are reported
+        too, as only the first of them would be created.
+        """
+        invalid: Dict[str, List[str]] = {}
+        uids = set()
+        checked = 0
+
+        async def transform(chunk: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+            chunk = [post for post in chunk if self.needs_transform(post, False)]
+            return [(post, prismic_doc) for post, prismic_doc in zip(chunk, await self.create_prismic_documents(chunk))
+                    if prismic_doc]
+
+        async def check(item: Tuple[Dict[str, Any], Dict[str, Any]]) -> None:
+            nonlocal checked
+            post, prismic_doc = item
+            errors = self.validator.validate(prismic_doc)
+            if prismic_doc.get('uid') in uids:
+                errors.append('another document has the same uid')
+            uids.add(prismic_doc.get('uid'))
+            checked += 1
+            if errors:
+                invalid.setdefault(prismic_doc.get('uid') or post['title'], []).extend(errors)
+                self.metrics.count('documents_validated_total', result='invalid')
+            else:
+                self.metrics.count('documents_validated_total', result='valid')
+
+        start = time.perf_counter()
+        stages = [
+            self.transform_stage(transform, transform_workers, transform_processes, queue_size),
+            Stage('validate', check, 1, queue_size),
+        ]
+        await self.run_stages(batched(posts, chunk_size), stages, transform_processes)
+
+        for uid, errors in invalid.items():
+            print(f"\n✗ {uid}")
+            for error in errors:
+                print(f"    {error}")
+        print(f"\nValidated {checked} documents in {time.perf_counter() - start:.1f} s: {len(invalid)} invalid")
+        return invalid
+
+    async def send_staging_file(self, staging_path: str, existing_posts: List[Dict[str, Any]], upload_workers: int = 4,
+                                create_workers: int = 2, queue_size: int = 16, resume: bool = False, delta: bool = False,
+                                start: int = None, stop: int = None) -> None:
+        """Send the documents of a staging file built by build_staging_file(), as migrate_to_prismic() would.
+
+        Nothing is parsed or converted, so sending goes as fast as the
+        network and rate limits allow. `start` and `stop` select a slice of
+        the staged documents. When sharded, only this shard's posts are sent.
+        """
+        existing_ids = {post['uid']: post.get('id') for post in existing_posts}
+        sent_before = self.documents_sent()
+        
+        with StagingReader(staging_path) as reader:
+            print(f"\nSending {staging_path}...")
+            # How far into the staging file sending has got drives the progress line's ETA
+            self.metrics.gauge('export_bytes_total', reader.size)
+            self.metrics.gauge('export_bytes_read', reader.tell)
+            
+            def staged() -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+                for record in reader.records(start, stop):
+                    post, prismic_doc = record['post'], record['document']
+                    if self.shard and not in_shard(post['post_id'] or '', self.shard):
+                        continue
+                    if self.should_send(post, prismic_doc, existing_ids, resume, delta):
+                        yield post, prismic_doc
+            
+            try:
+                await self.run_stages(staged(), self.sending_stages(upload_workers, create_workers, queue_size), 0)
+            finally:
+                self.metrics.gauge('export_bytes_read', reader.tell())
+        
+        print(f"\nMigrated {self.documents_sent() - sent_before} posts")
 
 async def main():
+    parser = argparse.ArgumentParser(description='Migrate a WordPress export to Prismic.')
+    parser.add_argument('xml_path', nargs='?', default='wordpress-export.xml', help='WordPress export XML file')
+    parser.add_argument('--transform-workers', type=int, default=None, help='Chunks of posts converted concurrently (default: one per transform process)')
+    parser.add_argument('--transform-processes', type=int, default=None, help='Processes converting HTML (default: one per core, 0: convert inline)')
+    parser.add_argument('--chunk-size', type=int, default=8, help='Posts sent to a transform process at a time')
+    parser.add_argument('--upload-workers', type=int, default=4, help='Posts whose images upload concurrently')
+    parser.add_argument('--preupload-workers', type=int, default=8, help='Attachments uploaded concurrently before any post (0: upload images as posts reference them)')
+    parser.add_argument('--create-workers', type=int, default=2, help='Documents created concurrently')
+    parser.add_argument('--queue-size', type=int, default=16, help='Maximum items waiting in front of each stage')
+    parser.add_argument('--max-in-flight', type=int, default=4, help='Maximum concurrent requests to Prismic')
+    parser.add_argument('--migration-rate', type=float, default=DEFAULT_RATES['migration'], help='Initial Migration API requests per second')
+    parser.add_argument('--asset-rate', type=float, default=DEFAULT_RATES['asset'], help='Initial Asset API requests per second')
+    parser.add_argument('--cdn-rate', type=float, default=DEFAULT_RATES['cdn'], help='Initial CDN API requests per second')
+    parser.add_argument('--max-connections', type=int, default=DEFAULT_POOL_LIMITS.max_connections, help='Connection pool size per host')
+    parser.add_argument('--max-keepalive-connections', type=int, default=DEFAULT_POOL_LIMITS.max_keepalive_connections, help='Idle connections kept open per host')
+    parser.add_argument('--asset-cache', default='asset_cache.sqlite3', help='SQLite file remembering uploaded images across runs')
+    parser.add_argument('--uid-index', default='uid_index.json', help='JSON file caching the UIDs already in Prismic')
+    parser.add_argument('--refresh-index', action='store_true', help='Refetch every existing post instead of only recently published ones')
+    parser.add_argument('--journal', default='migration_journal.jsonl', help='Append-only log of each post\'s migration progress')
+    parser.add_argument('--resume', action='store_true', help='Skip posts the journal records as created, without querying Prismic')
+    parser.add_argument('--fingerprints', default='post_fingerprints.sqlite3', help='SQLite file recording what each post looked like when last sent')
+    parser.add_argument('--delta', action='store_true', help='Only send new or changed posts, updating documents that already exist')
+    parser.add_argument('--http2', action='store_true', help="Use HTTP/2 where the server supports it (requires the 'h2' package)")
+    parser.add_argument('--optimize-images', action='store_true', help="Downscale and recompress JPEG, PNG and WebP images before uploading them (requires Pillow)")
+    parser.add_argument('--max-image-dimension', type=int, default=2048, help='Longest side, in pixels, of optimized images')
+    parser.add_argument('--image-quality', type=int, default=82, help='JPEG and WebP quality of optimized images')
+    parser.add_argument('--image-cache', default='optimized_images', help='Directory keeping optimized images across runs')
+    parser.add_argument('--shard', type=parse_shard, help='Only migrate shard i of N (e.g. 2/4), with its own journal, fingerprints and UID index and 1/N of the rates')
+    parser.add_argument('--assets-only', action='store_true', help='Stop after uploading attachments, e.g. so every shard has done so before posts reference them')
+    parser.add_argument('--metrics-file', help='Export metrics here periodically: Prometheus text for .prom files, JSON lines otherwise')
+    parser.add_argument('--metrics-interval', type=float, default=5.0, help='Seconds between metrics exports and progress updates')
+    parser.add_argument('--no-progress', action='store_true', help='Hide the live progress/ETA line')
+    parser.add_argument('--index', help='Export index built by wxr_index.py (default: <xml_path>.index.sqlite3, used when present and current)')
+    parser.add_argument('--no-index', action='store_true', help='Parse the whole export even if it has an index')
+    parser.add_argument('--post', action='append', default=[], metavar='ID_OR_SLUG', help='Only migrate this post, e.g. to debug it; builds the export index if needed (repeatable)')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Attempts per request before it fails for good; timeouts, dropped connections and 5xx are retried')
+    parser.add_argument('--retry-delay', type=float, default=0.5, help='Upper bound of the first retry\'s jittered delay, in seconds; doubles with every retry')
+    parser.add_argument('--circuit-threshold', type=int, default=5, help='Consecutive failures after which requests to an endpoint are paused')
+    parser.add_argument('--circuit-reset', type=float, default=10.0, help='Seconds requests to a failing endpoint are paused before one is tried again')
+    parser.add_argument('--dead-letters', default='dead_letters.jsonl', help='Append-only log of the documents and images that failed for good, for --replay')
+    parser.add_argument('--transform-cache', default='transform_cache.sqlite3', help="SQLite file keeping converted posts, so unchanged posts skip conversion ('' to disable)")
+    parser.add_argument('--transform-cache-mb', type=float, default=DEFAULT_MAX_BYTES / 2**20, help='Size the transform cache is kept under, evicting least recently used posts')
+    parser.add_argument('--build', metavar='STAGING_FILE', help='Only convert the posts, into this staging file, without contacting Prismic')
+    parser.add_argument('--send', metavar='STAGING_FILE', help='Send the documents of a staging file built with --build instead of converting the export')
+    parser.add_argument('--no-link-map', action='store_true', help='Keep links between posts as Web links instead of turning them into Document links')
+    parser.add_argument('--custom-types', default='customtypes', help='Directory of custom type models (<id>/index.json) documents are checked against before sending, when it exists')
+    parser.add_argument('--validate', action='store_true', help='Only convert the posts and check them against the custom type models, without contacting Prismic')
+    parser.add_argument('--replay', action='store_true', help='Retry the dead letters instead of migrating the export')
+    parser.add_argument('--verbose', action='store_true', help='Print every post and the full payload of every document sent')
+    args = parser.parse_args()
+    if args.resume and not args.journal:
+        parser.error("--resume needs a journal; --journal '' disables it")
+    if args.replay and not args.dead_letters:
+        parser.error("--replay needs a dead-letter file; --dead-letters '' disables it")
+    
+    if args.shard:
+        # Shards share the asset cache, so no image is uploaded twice; everything else is per shard
+        for name in ('journal', 'fingerprints', 'uid_index', 'metrics_file', 'dead_letters'):
+            setattr(args, name, shard_path(getattr(args, name), args.shard))
+        print(f"Migrating shard {args.shard[0]} of {args.shard[1]}")
+    
     # Print environment variables (without revealing sensitive data)
     print("Environment variables:")
     print(f"Repository name: {os.getenv('PRISMIC_REPOSITORY_NAME')}")
     print(f"API token length: {len(os.getenv('PRISMIC_ACCESS_TOKEN') or '')}")
     print(f"Migration key length: {len(os.getenv('PRISMIC_MIGRATION_API_KEY') or '')}")
     
-    migrator = WordPressToPrismicMigrator()
+    export_index = None
+    if args.post:
+        export_index = WxrIndex(args.xml_path, args.index)
+        if not export_index.is_current():
+            print(f"Indexing {args.xml_path}...")
+            export_index.build()
+    elif not args.no_index:
+        export_index = open_index(args.xml_path, args.index)
+    if export_index is not None:
+        print(f"Using the export index {export_index.path}")
     
-    # First, fetch current posts
-    existing_posts = await migrator.get_current_posts()
-    
-    # Then parse WordPress XML
-    posts = migrator.parse_wordpress_xml('wordpress-export.xml')
+    link_map = None
+    if not args.no_link_map and not args.build and not args.validate and os.path.exists(args.xml_path):
+        # One scan of the export up front; every link is then a dictionary lookup
+        try:
+            link_map = LinkMap.from_export(args.xml_path)
+            print(f"Mapped {len(link_map)} post URLs for internal links")
+        except Exception as e:
+            print(f"Error parsing WordPress XML: {str(e)}; keeping links between posts as Web links")
     
-    if not posts:
-        print("No posts found to migrate. Exiting.")
-        return
-        
-    print(f"\nFound {len(posts)} posts to migrate")
+    validator = None
+    custom_types = load_custom_types(args.custom_types) if os.path.isdir(args.custom_types) else {}
+    if custom_types:
+        validator = DocumentValidator(custom_types)
+        print(f"Validating documents against the custom types {', '.join(sorted(custom_types))} from {args.custom_types}")
+    elif args.validate:
+        parser.error(f"--validate needs custom type models in {args.custom_types}/<id>/index.json")
     
-    proceed = input("Do you want to proceed with the migration? (y/n): ")
-    if proceed.lower() != 'y':
-        print("Migration cancelled")
-        return
+    image_optimizer = None
+    if args.optimize_images:
+        if PILLOW_AVAILABLE:
+            image_optimizer = ImageOptimizer(args.image_cache, args.max_image_dimension, args.image_quality)
+        else:
+            print("Image optimization requested but Pillow is not installed; uploading original images")
     
-    await migrator.migrate_to_prismic(posts, existing_posts)
+    migrator = WordPressToPrismicMigrator(
+        max_in_flight=args.max_in_flight,
+        rates={'migration': args.migration_rate, 'asset': args.asset_rate, 'cdn': args.cdn_rate},
+        pool_limits=httpx.Limits(
+            max_connections=args.max_connections,
+            max_keepalive_connections=args.max_keepalive_connections,
+            keepalive_expiry=30.0,
+        ),
+        http2=args.http2,
+        asset_cache_path=args.asset_cache,
+        uid_index_path=args.uid_index,
+        journal_path=args.journal,
+        fingerprints_path=args.fingerprints,
+        image_optimizer=image_optimizer,
+        shard=args.shard,
+        export_index=export_index,
+        retry_policy=RetryPolicy(args.max_attempts, args.retry_delay),
+        circuit_threshold=args.circuit_threshold,
+        circuit_reset=args.circuit_reset,
+        dead_letter_path=args.dead_letters,
+        transform_cache_path=args.transform_cache,
+        transform_cache_bytes=int(args.transform_cache_mb * 2**20),
+        link_map=link_map,
+        validator=validator,
+        verbose=args.verbose,
+    )
+    async with migrator:
+        if args.validate:
+            async with MetricsReporter(migrator.metrics, args.metrics_file, args.metrics_interval, not args.no_progress):
+                invalid = await migrator.validate_export(
+                    migrator.iter_wordpress_posts(args.xml_path, only=args.post),
+                    transform_workers=args.transform_workers,
+                    queue_size=args.queue_size,
+                    transform_processes=args.transform_processes,
+                    chunk_size=args.chunk_size,
+                )
+            if invalid:
+                sys.exit(1)
+            return
+        
+        if args.build:
+            async with MetricsReporter(migrator.metrics, args.metrics_file, args.metrics_interval, not args.no_progress):
+                await migrator.build_staging_file(
+                    migrator.iter_wordpress_posts(args.xml_path, only=args.post),
+                    args.build,
+                    transform_workers=args.transform_workers,
+                    queue_size=args.queue_size,
+                    delta=args.delta,
+                    transform_processes=args.transform_processes,
+                    chunk_size=args.chunk_size,
+                )
+            return
+        
+        # First, fetch current posts; when resuming, the journal and the local UID index are enough
+        if args.resume:
+            existing_posts = migrator.uid_index.as_posts()
+            print(f"Resuming from {args.journal}: {len(migrator.journal.entries)} posts journaled")
+        else:
+            existing_posts = await migrator.get_current_posts(full_refresh=args.refresh_index)
+        
+        proceed = input("Do you want to proceed with the migration? (y/n): ")
+        if proceed.lower() != 'y':
+            print("Migration cancelled")
+            return
+        
+        reporter = MetricsReporter(migrator.metrics, args.metrics_file, args.metrics_interval, not args.no_progress)
+        async with reporter:
+            if args.replay:
+                await migrator.replay_dead_letters(workers=args.upload_workers)
+                return
+            
+            if args.send:
+                # Images upload as their documents need them; nothing is read from the export
+                await migrator.send_staging_file(
+                    args.send,
+                    existing_posts,
+                    upload_workers=args.upload_workers,
+                    create_workers=args.create_workers,
+                    queue_size=args.queue_size,
+                    resume=args.resume,
+                    delta=args.delta,
+                )
+            else:
+                # Upload the export's media library in bulk, so posts only have to look their images up
+                if (args.preupload_workers and not args.post) or args.assets_only:
+                    await migrator.preupload_attachments(args.xml_path, workers=args.preupload_workers or 8)
+                if args.assets_only:
+                    return
+                
+                # Then stream posts out of the WordPress XML; each one is migrated as soon as it is parsed
+                posts = migrator.iter_wordpress_posts(args.xml_path, only=args.post)
+                
+                await migrator.migrate_to_prismic(
+                    posts,
+                    existing_posts,
+                    transform_workers=args.transform_workers,
+                    upload_workers=args.upload_workers,
+                    create_workers=args.create_workers,
+                    queue_size=args.queue_size,
+                    resume=args.resume,
+                    delta=args.delta,
+                    transform_processes=args.transform_processes,
+                    chunk_size=args.chunk_size,
+                )
+            
+        failed = len(migrator.dead_letters.entries()) if migrator.dead_letters else 0
+        if failed:
+            print(f"{failed} documents and images failed; retry them with --replay (see {args.dead_letters})")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
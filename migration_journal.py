@@ -0,0 +1,79 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+# States a post moves through, in order; 'failed' can follow any of them
+PARSED = 'parsed'
+ASSETS_UPLOADED = 'assets_uploaded'
+CREATED = 'created'
+UPDATED = 'updated'
+FAILED = 'failed'
+
+
+class MigrationJournal:
+    """
+    Append-only, on-disk record of every post's progress through the migration.
+
+    Each state change is written as one JSON line and flushed immediately,
+    so after a crash the journal can be replayed to find out which posts
+    were created, which images were already uploaded and what failed.
+
+    :param path: JSON-lines file; appended to, never rewritten.
+    """
+
+    def __init__(self, path: str = 'migration_journal.jsonl'):
+        self.path = path
+        # Latest known record per UID, merged across all of its lines
+        self.entries: Dict[str, Dict[str, Any]] = read_journal(path) if os.path.exists(path) else {}
+        self.file = open(path, 'a')
+
+    def record(self, uid: str, state: str, **fields: Any) -> None:
+        """Append a state change for a post."""
+        entry = {'uid': uid, 'state': state, 'time': time.time(), **fields}
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+        merged = self.entries.setdefault(uid, {})
+        if state != FAILED:
+            merged.pop('reason', None)
+        merged.update(entry)
+
+    def get(self, uid: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(uid)
+
+    def state(self, uid: str) -> Optional[str]:
+        entry = self.entries.get(uid)
+        return entry['state'] if entry else None
+
+    def is_created(self, uid: str) -> bool:
+        """Whether the post's last recorded step was writing its document to Prismic."""
+        return self.state(uid) in (CREATED, UPDATED)
+
+    def asset_ids(self, uid: str) -> Dict[str, str]:
+        """Image URL -> asset ID for images already uploaded for this post."""
+        entry = self.entries.get(uid)
+        return dict(entry.get('assets', {})) if entry else {}
+
+    def close(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def read_journal(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    The latest known record per UID of an existing journal, without opening it for writing.
+
+    Raises FileNotFoundError when there is no journal at `path`.
+    """
+    entries: Dict[str, Dict[str, Any]] = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from a crash mid-write
+                continue
+            entries.setdefault(entry['uid'], {}).update(entry)
+    return entries
@@ -0,0 +1,103 @@
+import asyncio
+from itertools import islice
+from typing import Any, Awaitable, Callable, Iterable, Iterator, List, Optional
+
+# Marks the end of a stage's input; each worker consumes exactly one
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of an async pipeline.
+
+    `workers` coroutines pull items from a bounded input queue and pass them
+    to `handler`. Whatever the handler returns is forwarded to the next
+    stage; returning None drops the item.
+
+    :param name: Label used in progress and error messages.
+    :param handler: Coroutine function called once per item.
+    :param workers: Number of items this stage processes concurrently.
+    :param queue_size: Maximum number of items waiting in front of this stage.
+    :param fan_out: Treat the handler's result as a list of items to forward one by one.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Optional[Any]]],
+                 workers: int = 1, queue_size: int = 16, fan_out: bool = False):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.fan_out = fan_out
+        self.queue: asyncio.Queue = None
+
+
+def batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Lazily group an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, max(1, size)))
+        if not batch:
+            return
+        yield batch
+
+
+async def _feed(source: Iterable[Any], stage: Stage) -> None:
+    """Push items from a (possibly lazy) iterable into the first stage."""
+    for item in source:
+        await stage.queue.put(item)
+        # Let the downstream stages run between items when the queue isn't full
+        await asyncio.sleep(0)
+
+    for _ in range(stage.workers):
+        await stage.queue.put(_DONE)
+
+
+async def _work(stage: Stage, next_stage: Optional[Stage]) -> None:
+    """Process items from a stage's queue until its end marker arrives."""
+    while True:
+        item = await stage.queue.get()
+        if item is _DONE:
+            return
+
+        try:
+            result = await stage.handler(item)
+        except Exception as e:
+            print(f"✗ Unexpected error in {stage.name} stage: {str(e)}")
+            continue
+
+        if result is None or next_stage is None:
+            continue
+        for output in (result if stage.fan_out else (result,)):
+            await next_stage.queue.put(output)
+
+
+async def _run_stage(stage: Stage, next_stage: Optional[Stage]) -> None:
+    """Run all workers of a stage, then signal the end of input to the next one."""
+    await asyncio.gather(*(_work(stage, next_stage) for _ in range(stage.workers)))
+
+    if next_stage is not None:
+        for _ in range(next_stage.workers):
+            await next_stage.queue.put(_DONE)
+
+
+async def run_pipeline(source: Iterable[Any], stages: List[Stage]) -> None:
+    """
+    Stream `source` through `stages`, with a bounded queue in front of each one.
+
+    Every stage runs concurrently with the others, so a slow stage only
+    applies back-pressure to the ones before it instead of serializing
+    the whole run.
+    """
+    for stage in stages:
+        stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+
+    tasks = [asyncio.create_task(_feed(source, stages[0]))]
+    for i, stage in enumerate(stages):
+        next_stage = stages[i + 1] if i + 1 < len(stages) else None
+        tasks.append(asyncio.create_task(_run_stage(stage, next_stage)))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
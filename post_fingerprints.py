@@ -0,0 +1,68 @@
+import hashlib
+import sqlite3
+from typing import Any, Dict, Optional, Tuple
+
+
+def content_fingerprint(post: Dict[str, Any]) -> str:
+    """Hash the fields of a post that end up in its Prismic document."""
+    digest = hashlib.sha256()
+    for field in ('uid', 'title', 'publication_date', 'content'):
+        digest.update(post.get(field, '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class FingerprintStore:
+    """
+    What each WordPress post looked like when it was last sent to Prismic.
+
+    Rows are keyed by `wp:post_id` and hold the post's `wp:post_modified_gmt`,
+    a hash of its content and the resulting Prismic document, which is what
+    delta runs compare against to find new and changed posts.
+
+    :param path: SQLite database file; created on first use.
+    """
+
+    def __init__(self, path: str = 'post_fingerprints.sqlite3'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                post_id TEXT PRIMARY KEY,
+                modified_gmt TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                uid TEXT NOT NULL,
+                document_id TEXT NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def get(self, post_id: str) -> Optional[Tuple[str, str, str, str]]:
+        """Return (modified_gmt, sha256, uid, document_id) for a post, if it was sent before."""
+        return self.conn.execute(
+            'SELECT modified_gmt, sha256, uid, document_id FROM fingerprints WHERE post_id = ?',
+            (post_id,)
+        ).fetchone()
+
+    def is_unchanged(self, post_id: str, sha256: str) -> bool:
+        """
+        Whether a post's content matches what was last sent.
+
+        Only the content hash decides: the modified date misses edits that
+        bypass WordPress (e.g. a database search-replace), and flags posts
+        that were touched without actually changing.
+        """
+        row = self.get(post_id)
+        return bool(row) and row[1] == sha256
+
+    def put(self, post_id: str, modified_gmt: str, sha256: str, uid: str, document_id: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO fingerprints (post_id, modified_gmt, sha256, uid, document_id) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (post_id, modified_gmt, sha256, uid, document_id)
+            )
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+
+class TokenBucket:
+    """
+    An adaptive token bucket for a single endpoint.
+
+    Tokens refill at `rate` per second up to `capacity`. The rate grows
+    additively after a run of successful calls and is halved on every 429,
+    so the bucket settles just under whatever the server actually allows.
+
+    :param rate: Initial requests per second.
+    :param capacity: Maximum burst size.
+    :param min_rate: Floor the rate is never lowered below.
+    :param max_rate: Ceiling the rate is never raised above.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = None, max_rate: float = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.successes = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent. Callers are served in FIFO order."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block_for(self, seconds: float) -> None:
+        """Hold every caller back for `seconds`, e.g. until a rate-limit window resets."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        self.updated = max(now, self.blocked_until)
+
+    def throttled(self, retry_after: Optional[float]) -> float:
+        """Slow down after a 429 and return how long callers will be held back."""
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.successes = 0
+        delay = retry_after if retry_after is not None else 1 / self.rate
+        self.block_for(delay)
+        return delay
+
+    def succeeded(self) -> None:
+        """Speed up a little once a full second's worth of calls went through without a 429."""
+        self.successes += 1
+        if self.successes >= max(1.0, self.rate):
+            self.successes = 0
+            self.rate = min(self.max_rate, self.rate + self.min_rate)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit reset header, which is either a delay or a Unix timestamp."""
+    if not value:
+        return None
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    if reset > 1e9:
+        reset -= time.time()
+    return max(0.0, reset)
+
+
+class RateLimiter:
+    """
+    Per-endpoint token buckets shared by every outgoing request.
+
+    Call `acquire` before sending a request and `observe` with the response,
+    which feeds 429s, `Retry-After` and `X-RateLimit-*` / `RateLimit-*`
+    headers back into the endpoint's bucket.
+
+    :param rates: Initial requests per second, keyed by endpoint name.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        self.buckets = {endpoint: TokenBucket(rate) for endpoint, rate in rates.items()}
+
+    async def acquire(self, endpoint: str) -> None:
+        await self.buckets[endpoint].acquire()
+
+    def observe(self, endpoint: str, response: httpx.Response) -> Optional[float]:
+        """
+        Update an endpoint's bucket from a response.
+
+        Returns how long callers are held back when the response was a 429,
+        otherwise None.
+        """
+        bucket = self.buckets[endpoint]
+        headers = response.headers
+
+        if response.status_code == 429:
+            retry_after = parse_retry_after(headers.get('retry-after'))
+            if retry_after is None:
+                retry_after = parse_reset(headers.get('x-ratelimit-reset') or headers.get('ratelimit-reset'))
+            return bucket.throttled(retry_after)
+
+        bucket.succeeded()
+
+        remaining = headers.get('x-ratelimit-remaining') or headers.get('ratelimit-remaining')
+        if remaining is not None and remaining.strip() == '0':
+            reset = parse_reset(headers.get('x-ratelimit-reset') or headers.get('ratelimit-reset'))
+            if reset:
+                bucket.block_for(reset)
+        return None
@@ -1,24 +1,184 @@
+import argparse
+import fnmatch
+import re
+import time
+from collections import Counter
+from typing import Iterable
+
 from lxml import etree
 
+from wxr_reader import NAMESPACES, item_text
+
 # Path to the input and output XML files
 input_file = 'wordpress-export.xml'
 output_file = 'wordpress-prismic-updated.xml'
 
-def remove_comments(input_file, output_file):
-    # Parse the XML file
-    parser = etree.XMLParser(recover=True)  # Allow for minor XML errors
-    tree = etree.parse(input_file, parser)
+WP = '{%s}' % NAMESPACES['wp']
+
+NAMESPACE_DECLARATION = re.compile(rb'\s+xmlns(?::[\w.-]+)?="[^"]*"')
+
+# Statuses of posts that were never published
+DRAFT_STATUSES = ('draft', 'pending', 'auto-draft', 'trash')
+
+
+class FilterRules:
+    """
+    What to drop from a WordPress export.
+
+    :param drop_comments: Remove every <wp:comment>.
+    :param drop_meta: Glob patterns of <wp:postmeta> keys to remove, e.g. `_oembed_*`.
+    :param drop_statuses: Remove items with one of these <wp:status> values.
+    :param keep_types: Only keep items of these <wp:post_type> values; empty keeps all.
+    :param drop_types: Remove items of these <wp:post_type> values, e.g. `revision`.
+    """
+
+    def __init__(self, drop_comments: bool = True, drop_meta: Iterable[str] = (), drop_statuses: Iterable[str] = (),
+                 keep_types: Iterable[str] = (), drop_types: Iterable[str] = ()):
+        self.drop_comments = drop_comments
+        self.drop_meta = list(drop_meta)
+        self.drop_statuses = set(drop_statuses)
+        self.keep_types = set(keep_types)
+        self.drop_types = set(drop_types)
+
+    def keeps(self, item: etree._Element) -> bool:
+        """Whether an <item> stays in the export at all."""
+        post_type = item_text(item, 'wp:post_type')
+        if self.keep_types and post_type not in self.keep_types:
+            return False
+        if post_type in self.drop_types:
+            return False
+        return item_text(item, 'wp:status') not in self.drop_statuses
+
+    def strip(self, item: etree._Element, stats: Counter) -> None:
+        """Remove the comments and postmeta the rules drop from a kept <item>."""
+        for child in list(item):
+            if child.tag == WP + 'comment' and self.drop_comments:
+                stats['comments'] += 1
+            elif child.tag == WP + 'postmeta' and self.drop_meta:
+                key = item_text(child, 'wp:meta_key')
+                if not any(fnmatch.fnmatchcase(key, pattern) for pattern in self.drop_meta):
+                    continue
+                stats['postmeta'] += 1
+            else:
+                continue
+            # Keep the indentation that followed the removed element
+            previous = child.getprevious()
+            if previous is not None:
+                previous.tail = child.tail
+            item.remove(child)
+
+
+def read_prologue(input_file: str) -> bytes:
+    """Everything up to and including the <channel> start tag: the XML declaration, WordPress's notes and <rss>."""
+    with open(input_file, 'rb') as f:
+        data = b''
+        while True:
+            chunk = f.read(64 * 1024)
+            data += chunk
+            start = data.find(b'<channel')
+            end = data.find(b'>', start) if start != -1 else -1
+            if end != -1:
+                return data[:end + 1]
+            if not chunk:
+                raise ValueError(f'{input_file} has no <channel> element; is it a WordPress export?')
+
+
+def serialize(elem: etree._Element, declared: bytes) -> bytes:
+    """
+    Serialize a channel child, with its tail.
 
-    # Find and remove all <wp:comment> elements
-    for comment in tree.xpath('//wp:comment', namespaces={'wp': 'http://wordpress.org/export/1.2/'}):
-        comment.getparent().remove(comment)
+    Detached from the tree, lxml would repeat every namespace declaration of
+    <rss> on the element; those in `declared` are dropped again.
+    """
+    markup = etree.tostring(elem, encoding='utf-8', with_tail=True)
+    end = markup.index(b'>')
+    return NAMESPACE_DECLARATION.sub(lambda m: b'' if m.group(0) in declared else m.group(0), markup[:end]) + markup[end:]
 
-    # Write the updated XML back to a new file
-    # Use `method="xml"` and specify encoding as UTF-8, without HTML escaping
-    with open(output_file, 'wb') as f:
-        tree.write(f, pretty_print=True, xml_declaration=True, encoding='UTF-8', method="xml")
 
-    print(f'Updated XML saved as {output_file}')
+def filter_export(input_file: str, output_file: str, rules: FilterRules) -> Counter:
+    """
+    Copy a WordPress export element by element, dropping what `rules` say.
+
+    Only one channel child (an <item>, an author, a category...) is held in
+    memory at a time, so memory stays flat however big the export is. The
+    prologue is copied byte for byte and CDATA sections are written back as
+    CDATA.
+
+    Returns counts of the items, comments and postmeta entries dropped.
+    """
+    stats: Counter = Counter()
+    prologue = read_prologue(input_file)
+    declared = b' '.join(NAMESPACE_DECLARATION.findall(prologue))
+    # Only <item> events reach Python; the channel's other children are picked up as the items' siblings
+    context = etree.iterparse(input_file, events=('end',), tag='item', strip_cdata=False, huge_tree=True, recover=True)
+
+    def write_siblings(channel: etree._Element, before: etree._Element = None) -> None:
+        """Write the channel's children preceding `before` (all of them when None), then drop them."""
+        for child in list(channel):
+            if child is before:
+                break
+            out.write(serialize(child, declared))
+            channel.remove(child)
+
+    with open(output_file, 'wb', buffering=1024 * 1024) as out:
+        out.write(prologue)
+        channel = None
+
+        for event, elem in context:
+            if elem.getparent() is not channel:
+                channel = elem.getparent()
+                # The whitespace between <channel> and its first child
+                out.write((channel.text or '').encode('utf-8'))
+            write_siblings(channel, elem)
+
+            if rules.keeps(elem):
+                rules.strip(elem, stats)
+                out.write(serialize(elem, declared))
+            else:
+                stats[f'items ({item_text(elem, "wp:post_type")}, {item_text(elem, "wp:status")})'] += 1
+                out.write((elem.tail or '').encode('utf-8'))
+
+            # It's important to clear the element to save memory
+            elem.clear()
+            channel.remove(elem)
+
+        if channel is None:
+            channel = context.root.find('channel')
+            out.write((channel.text or '').encode('utf-8'))
+        write_siblings(channel)
+        out.write(b'</channel>' + (channel.tail or '').encode('utf-8') + b'</rss>\n')
+
+    del context
+    return stats
+
+
+def remove_comments(input_file, output_file):
+    stats = filter_export(input_file, output_file, FilterRules())
+    print(f'Removed {stats["comments"]} comments; updated XML saved as {output_file}')
+
 
 if __name__ == '__main__':
-    remove_comments(input_file, output_file)
+    parser = argparse.ArgumentParser(description='Strip comments and other unneeded content from a WordPress export, streaming.')
+    parser.add_argument('input_file', nargs='?', default=input_file)
+    parser.add_argument('output_file', nargs='?', default=output_file)
+    parser.add_argument('--keep-comments', action='store_true', help='Keep <wp:comment> elements')
+    parser.add_argument('--drop-meta', action='append', default=[], metavar='PATTERN', help="Drop postmeta whose key matches this glob, e.g. '_oembed_*' (repeatable)")
+    parser.add_argument('--drop-status', action='append', default=[], metavar='STATUS', help='Drop items with this status (repeatable)')
+    parser.add_argument('--drop-drafts', action='store_true', help=f"Drop unpublished items ({', '.join(DRAFT_STATUSES)})")
+    parser.add_argument('--drop-revisions', action='store_true', help='Drop revision items')
+    parser.add_argument('--post-types', help='Comma-separated post types to keep, e.g. post,attachment; others are dropped')
+    args = parser.parse_args()
+
+    rules = FilterRules(
+        drop_comments=not args.keep_comments,
+        drop_meta=args.drop_meta,
+        drop_statuses=args.drop_status + (list(DRAFT_STATUSES) if args.drop_drafts else []),
+        keep_types=args.post_types.split(',') if args.post_types else (),
+        drop_types=['revision'] if args.drop_revisions else [],
+    )
+    start = time.perf_counter()
+    stats = filter_export(args.input_file, args.output_file, rules)
+    elapsed = time.perf_counter() - start
+    print(f'Updated XML saved as {args.output_file} in {elapsed:.1f} s')
+    for what, count in sorted(stats.items()):
+        print(f'  dropped {count} {what}')
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+# Statuses worth trying again: the server is overloaded, restarting or timed out, not rejecting the request itself
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Failures that happen before a request reaches the server, so sending it again can't do anything twice
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Circuit breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_retryable(error: Optional[BaseException] = None, status_code: int = None) -> bool:
+    """
+    Whether a failed request may succeed if sent again.
+
+    Timeouts, dropped connections and 429/5xx responses are retryable; any
+    other 4xx means the request itself is wrong and will fail every time.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+    elif isinstance(error, httpx.TransportError):
+        return True
+    elif error is not None:
+        return False
+    return status_code in RETRYABLE_STATUSES or (status_code or 0) >= 500
+
+
+def describe_error(error: BaseException) -> str:
+    """A one-line reason for a failure, with the response body when the server sent one."""
+    # httpx appends a line pointing at MDN to status errors
+    message = str(error).split('\n')[0] or type(error).__name__
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"{message} {error.response.text[:500]}".strip()
+    return message
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    The n-th retry waits a random time between 0 and `base_delay * 2**n`,
+    capped at `max_delay`, so workers that failed together don't all come
+    back at the same moment.
+
+    :param max_attempts: Attempts per request, the first one included.
+    :param base_delay: Upper bound of the first retry's delay, in seconds.
+    :param max_delay: Upper bound of any delay, in seconds.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before retry number `retry` (counted from 0)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class CircuitBreaker:
+    """
+    Stops every worker from calling a service that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    `wait` holds callers back for `reset_timeout` seconds. Then a single
+    probe request is let through: if it succeeds the circuit closes, if it
+    fails the circuit opens again for twice as long, up to
+    `max_reset_timeout`.
+
+    :param failure_threshold: Consecutive failures that open the circuit.
+    :param reset_timeout: Seconds the circuit first stays open.
+    :param max_reset_timeout: Longest the circuit stays open between probes.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, max_reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.initial_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        # When the probe of a half-open circuit was let through; None while nobody probes
+        self.probe_started: Optional[float] = None
+        self.opened = 0
+        self._closed = asyncio.Event()
+        self._closed.set()
+
+    async def wait(self) -> None:
+        """Return once a request may be sent: right away while closed, otherwise when it's this caller's turn to probe."""
+        while self.state != CLOSED:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.open_until:
+                self.state = HALF_OPEN
+                self.probe_started = None
+
+            if self.state == HALF_OPEN:
+                # A probe that never reported back (e.g. cancelled) doesn't block the circuit forever
+                if self.probe_started is None or now - self.probe_started > self.reset_timeout:
+                    self.probe_started = now
+                    return
+                timeout = self.reset_timeout
+            else:
+                timeout = self.open_until - now
+
+            try:
+                await asyncio.wait_for(self._closed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def succeeded(self) -> None:
+        self.failures = 0
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self.reset_timeout = self.initial_reset_timeout
+            self.probe_started = None
+            self._closed.set()
+
+    def failed(self) -> bool:
+        """Record a failure; returns True when it opened the circuit."""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+        elif self.state == OPEN or self.failures < self.failure_threshold:
+            return False
+
+        self.state = OPEN
+        self.open_until = time.monotonic() + self.reset_timeout
+        self.probe_started = None
+        self.opened += 1
+        self._closed.clear()
+        return True
+
+
+class DeadLetterQueue:
+    """
+    Append-only JSON-lines file of the items that failed for good.
+
+    Each line records what failed (`kind`, e.g. 'document' or 'asset'), its
+    key, why, whether retrying later could help, and whatever payload is
+    needed to try it again, so a later run can replay the file instead of
+    the whole migration. Items that later went through, on replay or in any
+    other run, are marked resolved by another line, so a crash mid-replay
+    loses nothing.
+
+    :param path: JSON-lines file; appended to, and only rewritten by `compact`.
+    """
+
+    def __init__(self, path: str = 'dead_letters.jsonl'):
+        self.path = path
+        # Unresolved (kind, key) pairs, so resolving something that never failed writes nothing
+        self.pending = {(entry['kind'], entry['key']): entry for entry in read_dead_letters(path)}
+        self.file = open(path, 'a')
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    def add(self, kind: str, key: str, reason: str, retryable: bool, **payload: Any) -> None:
+        entry = {'kind': kind, 'key': key, 'reason': reason, 'retryable': retryable, 'time': time.time(), **payload}
+        self.pending[(kind, key)] = entry
+        self._write(entry)
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        """The unresolved entry of an item, if it is dead-lettered."""
+        return self.pending.get((kind, key))
+
+    def resolve(self, kind: str, key: str) -> None:
+        """Mark an item as gone through; does nothing unless it is dead-lettered."""
+        if self.pending.pop((kind, key), None) is not None:
+            self._write({'kind': kind, 'key': key, 'resolved': True, 'time': time.time()})
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return read_dead_letters(self.path)
+
+    def compact(self) -> int:
+        """Rewrite the file with only the unresolved entries; returns how many remain."""
+        entries = self.entries()
+        self.file.close()
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'a')
+        return len(entries)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_dead_letters(path: str) -> List[Dict[str, Any]]:
+    """The latest unresolved entry per (kind, key) of a dead-letter file, in the order they first failed."""
+    entries: Dict[tuple, Dict[str, Any]] = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write
+                    continue
+                key = (entry.get('kind'), entry.get('key'))
+                if entry.get('resolved'):
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+    return list(entries.values())
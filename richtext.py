@@ -0,0 +1,311 @@
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+# Elements that start a new rich-text block, and the Prismic block type they map to
+BLOCK_TAGS = {
+    'p': 'paragraph',
+    'div': 'paragraph',
+    'blockquote': 'paragraph',
+    'h1': 'heading1',
+    'h2': 'heading2',
+    'h3': 'heading3',
+    'h4': 'heading4',
+    'h5': 'heading5',
+    'h6': 'heading6',
+    'pre': 'preformatted',
+    'li': 'list-item',
+    # Prismic has no tables; each cell becomes a paragraph of its own
+    'td': 'paragraph',
+    'th': 'paragraph',
+}
+
+# Inline elements that become spans
+SPAN_TAGS = {
+    'strong': 'strong',
+    'b': 'strong',
+    'em': 'em',
+    'i': 'em',
+    'a': 'hyperlink',
+}
+
+# Elements whose content is never shown
+SKIPPED_TAGS = {'script', 'style'}
+
+CAPTION_SHORTCODE = re.compile(r'\[caption[^\]]*\]|\[/caption\]')
+PARAGRAPH_BREAK = re.compile(r'[ \t\r\f\v]*\n[ \t\r\f\v]*\n\s*')
+LINE_BREAK = re.compile(r'[ \t\r\f\v]*\n[ \t\r\f\v]*')
+INLINE_WHITESPACE = re.compile(r'[ \t\r\f\v\n]+')
+SPACES = re.compile(r'[ \t\r\f\v]+')
+BLANK_LINES = re.compile(r'^(?:[ \t\r\f\v]*\n)*')
+
+
+def utf16_length(text: str) -> int:
+    """Length of text in UTF-16 code units, which is what Prismic span offsets count (as JavaScript strings do)."""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def strip_double_slashes(string: str) -> str:
+    """Remove the escaped quotes some exports leave around attribute values."""
+    return string.replace('"\\', '').replace('\\"', '')
+
+
+class RichTextConverter(HTMLParser):
+    """
+    Convert WordPress post HTML to Prismic rich text in a single pass.
+
+    Blocks and spans are built directly from the parser's start tag, end tag
+    and text callbacks, so each post is tokenized exactly once. Text outside
+    explicit block elements follows WordPress' auto-paragraph rules: blank
+    lines separate paragraphs and single newlines are line breaks.
+
+    `[caption]` shortcodes become image blocks carrying the source `url`,
+    `alt`, `title` and `caption`; the asset `id` is filled in later.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self.blocks: List[Dict[str, Any]] = []
+        self.chunks: List[str] = []
+        self.length = 0
+        self.spans: List[Dict[str, Any]] = []
+        # (tag, span type, start offset, data) for every span still open
+        self.open_spans: List[list] = []
+        self.block_stack: List[str] = []
+        self.list_stack: List[str] = []
+        self.pre_depth = 0
+        self.skip_depth = 0
+        self.caption: Optional[Dict[str, Any]] = None
+
+    def convert(self, html_content: str) -> List[Dict[str, Any]]:
+        """Convert one post's HTML and return its rich-text blocks."""
+        self.reset()
+        self._reset_state()
+        self.feed(html_content)
+        self.close()
+        self._flush()
+        return self.blocks
+
+    # Block handling
+
+    def _block_type(self) -> str:
+        return self.block_stack[-1] if self.block_stack else 'paragraph'
+
+    def _flush(self) -> None:
+        """End the current block, trimming surrounding whitespace and clamping spans to it.
+
+        Preformatted blocks only lose their surrounding blank lines, so the
+        indentation of their first line survives.
+        """
+        text = ''.join(self.chunks)
+        end = self.length
+
+        # Spans still open continue into the next block
+        for open_span in self.open_spans:
+            if end > open_span[2]:
+                self.spans.append(self._span(open_span, end))
+            open_span[2] = 0
+
+        if self._block_type() == 'preformatted':
+            blank_lines = BLANK_LINES.match(text).group()
+            stripped = text[len(blank_lines):].rstrip()
+            lead = utf16_length(blank_lines)
+        else:
+            stripped = text.strip()
+            lead = utf16_length(text) - utf16_length(text.lstrip())
+        if stripped:
+            length = utf16_length(stripped)
+            spans = []
+            for span in self.spans:
+                start = max(0, span['start'] - lead)
+                stop = min(length, span['end'] - lead)
+                if stop > start:
+                    span['start'], span['end'] = start, stop
+                    spans.append(span)
+            spans.sort(key=lambda span: (span['start'], -span['end']))
+
+            self.blocks.append({
+                'type': self._block_type(),
+                'text': stripped,
+                'spans': spans,
+                'direction': 'ltr',
+            })
+
+        self.chunks = []
+        self.length = 0
+        self.spans = []
+
+    def _span(self, open_span: list, end: int) -> Dict[str, Any]:
+        tag, span_type, start, data = open_span
+        span = {'start': start, 'end': end, 'type': span_type}
+        if data:
+            span['data'] = data
+        return span
+
+    def _append(self, text: str) -> None:
+        if not text:
+            return
+        self.chunks.append(text)
+        self.length += utf16_length(text)
+
+    def _last_char(self) -> str:
+        return self.chunks[-1][-1] if self.chunks else ''
+
+    def _text(self, text: str) -> None:
+        """Add text to the current block, normalizing whitespace as a browser would."""
+        if self.pre_depth:
+            self._append(text)
+            return
+
+        if self.block_stack:
+            text = INLINE_WHITESPACE.sub(' ', text)
+        else:
+            # Outside explicit blocks, WordPress treats blank lines as paragraph breaks
+            paragraphs = PARAGRAPH_BREAK.split(text)
+            for paragraph in paragraphs[:-1]:
+                self._inline_text(SPACES.sub(' ', LINE_BREAK.sub('\n', paragraph)))
+                self._flush()
+            text = SPACES.sub(' ', LINE_BREAK.sub('\n', paragraphs[-1]))
+
+        self._inline_text(text)
+
+    def _inline_text(self, text: str) -> None:
+        # Collapse whitespace across chunk boundaries, and drop it at the start of a block
+        if text[:1] in (' ', '\n') and (not self.length or self._last_char() in (' ', '\n')):
+            text = text.lstrip(' ')
+            if not self.length or self._last_char() == '\n':
+                text = text.lstrip('\n')
+        self._append(text)
+
+    # Captions
+
+    def _caption_text(self, text: str) -> None:
+        self.caption['text'].append(text)
+
+    def _start_caption(self) -> None:
+        self._flush()
+        self.caption = {'image': None, 'text': []}
+
+    def _end_caption(self) -> None:
+        caption, self.caption = self.caption, None
+        image = caption['image']
+        if image:
+            image['caption'] = INLINE_WHITESPACE.sub(' ', ''.join(caption['text'])).strip()
+            self.blocks.append(image)
+
+    def _image(self, attrs: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        url = strip_double_slashes(attrs.get('src') or '')
+        if not url:
+            return None
+        return {
+            'type': 'image',
+            'url': url,
+            'alt': strip_double_slashes(attrs.get('alt') or ''),
+            'title': strip_double_slashes(attrs.get('title') or ''),
+        }
+
+    # HTMLParser callbacks
+
+    def handle_starttag(self, tag: str, attrs: List[tuple]) -> None:
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+            return
+        attrs = dict(attrs)
+
+        if tag == 'img':
+            image = self._image(attrs)
+            if self.caption is not None:
+                if image and not self.caption['image']:
+                    self.caption['image'] = image
+            elif image:
+                self._flush()
+                self.blocks.append(image)
+            return
+
+        if self.caption is not None:
+            return
+
+        if tag in ('ul', 'ol'):
+            self._flush()
+            self.list_stack.append(tag)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            block_type = BLOCK_TAGS[tag]
+            if tag == 'li' and self.list_stack and self.list_stack[-1] == 'ol':
+                block_type = 'o-list-item'
+            self.block_stack.append(block_type)
+            if tag == 'pre':
+                self.pre_depth += 1
+        elif tag == 'br':
+            self._append('\n')
+        elif tag in SPAN_TAGS:
+            data = None
+            if tag == 'a':
+                href = strip_double_slashes(attrs.get('href') or '')
+                if not href:
+                    return
+                if href.startswith('www.'):
+                    href = f'http://{href}'
+                data = {'link_type': 'Web', 'url': href}
+                if attrs.get('target') == '_blank':
+                    data['target'] = '_blank'
+            self.open_spans.append([tag, SPAN_TAGS[tag], self.length, data])
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.caption is not None:
+            return
+
+        if tag in ('ul', 'ol'):
+            self._flush()
+            if self.list_stack:
+                self.list_stack.pop()
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if self.block_stack:
+                self.block_stack.pop()
+            if tag == 'pre':
+                self.pre_depth = max(0, self.pre_depth - 1)
+        elif tag in SPAN_TAGS:
+            # Close the innermost matching span; tolerate badly nested markup
+            for i in range(len(self.open_spans) - 1, -1, -1):
+                if self.open_spans[i][0] == tag:
+                    open_span = self.open_spans.pop(i)
+                    if self.length > open_span[2]:
+                        self.spans.append(self._span(open_span, self.length))
+                    break
+
+    def handle_data(self, data: str) -> None:
+        if self.skip_depth:
+            return
+
+        position = 0
+        for match in CAPTION_SHORTCODE.finditer(data):
+            self._route_text(data[position:match.start()])
+            if match.group().startswith('[/'):
+                if self.caption is not None:
+                    self._end_caption()
+            elif self.caption is None:
+                self._start_caption()
+            position = match.end()
+        self._route_text(data[position:])
+
+    def _route_text(self, text: str) -> None:
+        if not text:
+            return
+        if self.caption is not None:
+            self._caption_text(text)
+        else:
+            self._text(text)
+
+
+def html_to_richtext(html_content: str) -> List[Dict[str, Any]]:
+    """Convert a post's HTML content to a list of Prismic rich-text blocks."""
+    if not html_content:
+        return []
+    return RichTextConverter().convert(html_content)
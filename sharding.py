@@ -0,0 +1,42 @@
+import argparse
+import os
+import zlib
+from typing import Tuple
+
+# (index, count), with index counted from 1
+Shard = Tuple[int, int]
+
+
+def parse_shard(value: str) -> Shard:
+    """Parse an `i/N` shard spec, for use as an argparse type."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, expected i/N (e.g. 1/4)")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, i must be between 1 and N")
+    return index, count
+
+
+def shard_of(key: str, count: int) -> int:
+    """
+    The shard (1..count) a key belongs to.
+
+    CRC-32 of the key rather than hash(), which is salted per process, so
+    every host running the same export agrees on the split.
+    """
+    return zlib.crc32(key.encode('utf-8')) % count + 1
+
+
+def in_shard(key: str, shard: Shard) -> bool:
+    index, count = shard
+    return shard_of(key, count) == index
+
+
+def shard_path(path: str, shard: Shard) -> str:
+    """Per-shard variant of a state file, e.g. `migration_journal.shard-2-of-4.jsonl`."""
+    if not path:
+        return path
+    root, extension = os.path.splitext(path)
+    index, count = shard
+    return f'{root}.shard-{index}-of-{count}{extension}'
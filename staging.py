@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# First bytes of every staging file, versioned in case the record layout changes
+MAGIC = b'WPSTAGE1'
+# Each record is its length, then that many bytes of compact JSON
+RECORD_LENGTH = struct.Struct('>I')
+# The index holds (offset, length) of every record, in file order
+INDEX_ENTRY = struct.Struct('>QI')
+
+
+def index_path_for(path: str) -> str:
+    return f'{path}.idx'
+
+
+class StagingWriter:
+    """
+    Writes finished documents to a staging file, one length-prefixed JSON record each.
+
+    The file and its offset index are written under temporary names and only
+    moved into place by `close`, so a crashed build never leaves a staging
+    file that looks complete.
+
+    :param path: Staging file; an index is written next to it (`<path>.idx`).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f'{path}.tmp'
+        self.file = open(self.tmp_path, 'wb', buffering=1024 * 1024)
+        self.file.write(MAGIC)
+        self.index: List[Tuple[int, int]] = []
+
+    def append(self, record: Dict[str, Any]) -> None:
+        data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        self.index.append((self.file.tell(), len(data)))
+        self.file.write(RECORD_LENGTH.pack(len(data)))
+        self.file.write(data)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self) -> None:
+        """Finish the staging file and its index and move both into place."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        tmp_index = index_path_for(self.tmp_path)
+        with open(tmp_index, 'wb') as f:
+            for entry in self.index:
+                f.write(INDEX_ENTRY.pack(*entry))
+        os.replace(self.tmp_path, self.path)
+        os.replace(tmp_index, index_path_for(self.path))
+
+    def abort(self) -> None:
+        """Drop everything written so far."""
+        self.file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self) -> 'StagingWriter':
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class StagingReader:
+    """
+    Reads a staging file written by `StagingWriter`, in order or by record number.
+
+    Streaming needs nothing but the file; random access and slicing use its
+    offset index.
+
+    :param path: Staging file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f'{path} is not a staging file')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.index: Optional[List[Tuple[int, int]]] = None
+        index_path = index_path_for(path)
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                self.index = list(INDEX_ENTRY.iter_unpack(f.read()))
+
+    def __len__(self) -> int:
+        if self.index is None:
+            return sum(1 for _ in self.records())
+        return len(self.index)
+
+    def read(self, position: int) -> Dict[str, Any]:
+        """The record at `position`, with a single seek."""
+        if self.index is None:
+            raise ValueError(f'{self.path} has no index; random access needs {index_path_for(self.path)}')
+        offset, length = self.index[position]
+        self.file.seek(offset + RECORD_LENGTH.size)
+        return json.loads(self.file.read(length))
+
+    def records(self, start: int = None, stop: int = None) -> Iterator[Dict[str, Any]]:
+        """Stream the records, optionally just positions `start` to `stop` like a slice."""
+        start = start or 0
+        if start and self.index is not None:
+            if start >= len(self.index):
+                return
+            self.file.seek(self.index[start][0])
+            position = start
+        else:
+            self.file.seek(len(MAGIC))
+            position = 0
+
+        while stop is None or position < stop:
+            header = self.file.read(RECORD_LENGTH.size)
+            if len(header) < RECORD_LENGTH.size:
+                return
+            (length,) = RECORD_LENGTH.unpack(header)
+            data = self.file.read(length)
+            if position >= start:
+                yield json.loads(data)
+            position += 1
+
+    def tell(self) -> int:
+        """How far into the file reading has got, in bytes."""
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> 'StagingReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect a staging file built by migrate.py --build.')
+    parser.add_argument('path', help='Staging file')
+    parser.add_argument('--show', type=int, action='append', default=[], metavar='N', help='Print record N as JSON (repeatable)')
+    parser.add_argument('--uid', action='append', default=[], help='Print the record of the document with this UID (repeatable)')
+    args = parser.parse_args()
+
+    with StagingReader(args.path) as reader:
+        print(f"{args.path}: {len(reader)} documents, {reader.size / 2**20:.1f} MB")
+        for position in args.show:
+            print(json.dumps(reader.read(position), indent=2))
+        if args.uid:
+            for record in reader.records():
+                if record['document']['uid'] in args.uid:
+                    print(json.dumps(record, indent=2))
@@ -0,0 +1,88 @@
+import hashlib
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import richtext
+from richtext import html_to_richtext
+
+# Module-level functions so they can be shipped to ProcessPoolExecutor workers
+
+
+def html_to_prismic_richtext(html_content: str) -> List[Dict[str, Any]]:
+    """Convert HTML content to Prismic Rich Text format, handling inline captions.
+
+    Image blocks only carry the source `url` at this point; their asset `id`
+    is filled in when the document's assets are uploaded.
+    """
+    try:
+        return html_to_richtext(html_content)
+    except Exception as e:
+        print(f"Error converting HTML to rich text: {str(e)}")
+        return []
+
+
+def document_uid(post: Dict[str, Any]) -> str:
+    """The UID of a post's document: its slug, or one made from its title."""
+    uid = post['uid'] or re.sub(r'[^a-z0-9-]', '', post['title'].lower().replace(' ', '-'))
+    return uid[:150]  # Ensure UID isn't too long
+
+
+def create_prismic_document(post: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Transform WordPress post into Prismic document format."""
+    try:
+        uid = document_uid(post)
+
+        try:
+            pub_date = datetime.strptime(
+                post['publication_date'],
+                '%a, %d %b %Y %H:%M:%S %z'
+            ).strftime('%Y-%m-%d')
+        except:
+            pub_date = datetime.now().strftime('%Y-%m-%d')
+
+        return {
+            'title': post['title'],
+            'uid': uid,
+            'type': 'post',
+            'lang': 'en-us',
+            'data': {
+                'title': [{
+                    'type': 'paragraph',
+                    'text': post['title'],
+                    'spans': [],
+                    'direction': 'ltr'
+                }],
+                'published_date': pub_date,
+                'body': html_to_prismic_richtext(post['content']),
+                # 'author': {
+                #     'link_type': 'Any',
+                #     'text': 'AWP Network'
+                # },
+                'slices': []
+            }
+        }
+    except Exception as e:
+        print(f"Error creating Prismic document: {str(e)}")
+        return None
+
+
+def create_prismic_documents(posts: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """Transform a chunk of posts; one result (or None) per post, in order."""
+    return [create_prismic_document(post) for post in posts]
+
+
+def converter_version() -> str:
+    """
+    Identify the conversion code: a hash of the modules it lives in.
+
+    Cached conversions (see transform_cache.py) are keyed by it, so any
+    change to how posts are converted invalidates them without anyone
+    having to remember to bump a version number.
+    """
+    digest = hashlib.sha256()
+    for module in (sys.modules[__name__], richtext):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
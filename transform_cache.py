@@ -0,0 +1,108 @@
+import json
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Tuple
+
+from transform import converter_version
+
+# Default bound on the cached documents' compressed size
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class TransformCache:
+    """
+    Persistent memo of converted posts, so unchanged posts skip conversion on later runs.
+
+    Documents are keyed by the post's content fingerprint (see
+    post_fingerprints.py) and the converter version, and stored as
+    compressed JSON. Image blocks hold their source URL only; asset IDs are
+    resolved after conversion, so uploads never invalidate an entry. Once
+    the cache outgrows `max_bytes`, the least recently used documents are
+    evicted.
+
+    :param path: SQLite database file; created on first use.
+    :param max_bytes: Bound on the total compressed size of the cached documents.
+    :param version: Converter version entries are valid for (default: the current code's).
+    """
+
+    def __init__(self, path: str = 'transform_cache.sqlite3', max_bytes: int = DEFAULT_MAX_BYTES, version: str = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version or converter_version()
+        # Content-keyed, so shards of a migration can share the file; wait for each other's writes
+        self.conn = sqlite3.connect(path, timeout=30.0)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                document BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used);
+        ''')
+        self.conn.commit()
+        # Entries of other converter versions can never be hit again
+        with self.conn:
+            self.conn.execute('DELETE FROM documents WHERE key NOT LIKE ?', (f'{self.version}:%',))
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM documents').fetchone()[0]
+
+    def key(self, fingerprint: str) -> str:
+        return f'{self.version}:{fingerprint}'
+
+    def get_many(self, fingerprints: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """The cached documents of the given content fingerprints, for those that have one."""
+        keys = {self.key(fingerprint): fingerprint for fingerprint in fingerprints}
+        if not keys:
+            return {}
+        rows = self.conn.execute(
+            f'SELECT key, document FROM documents WHERE key IN ({", ".join("?" * len(keys))})',
+            list(keys)
+        ).fetchall()
+        with self.conn:
+            self.conn.executemany('UPDATE documents SET last_used = ? WHERE key = ?',
+                                  [(time.time(), key) for key, _ in rows])
+        return {keys[key]: json.loads(zlib.decompress(document)) for key, document in rows}
+
+    def put_many(self, documents: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Cache (fingerprint, document) pairs, then evict down to the size bound."""
+        rows = []
+        for fingerprint, document in documents:
+            blob = zlib.compress(json.dumps(document).encode('utf-8'))
+            rows.append((self.key(fingerprint), blob, len(blob), time.time()))
+        with self.conn:
+            for key, _, _, _ in rows:
+                replaced = self.conn.execute('SELECT size FROM documents WHERE key = ?', (key,)).fetchone()
+                if replaced:
+                    self.size -= replaced[0]
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO documents (key, document, size, last_used) VALUES (?, ?, ?, ?)', rows
+            )
+        self.size += sum(row[2] for row in rows)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop the least recently used documents until the cache is back under 90% of its bound; returns how many."""
+        target = self.max_bytes * 0.9
+        evicted = 0
+        with self.conn:
+            while self.size > target:
+                rows = self.conn.execute('SELECT key, size FROM documents ORDER BY last_used LIMIT 100').fetchall()
+                if not rows:
+                    self.size = 0
+                    break
+                for key, size in rows:
+                    if self.size <= target:
+                        break
+                    self.conn.execute('DELETE FROM documents WHERE key = ?', (key,))
+                    self.size -= size
+                    evicted += 1
+        return evicted
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
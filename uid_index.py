@@ -0,0 +1,74 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class UidIndex:
+    """
+    Local copy of the UIDs already published in Prismic.
+
+    Maps each UID to its document ID and last publication date, and
+    remembers the newest publication date seen so later runs only need to
+    ask Prismic for documents published since then.
+
+    :param path: JSON file the index is loaded from and saved to.
+    """
+
+    def __init__(self, path: str = 'uid_index.json'):
+        self.path = path
+        self.documents: Dict[str, Tuple[str, str]] = {}
+        self.last_publication_date: Optional[str] = None
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.documents = {uid: tuple(entry) for uid, entry in data.get('documents', {}).items()}
+            self.last_publication_date = data.get('last_publication_date')
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.documents
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def get_id(self, uid: str) -> Optional[str]:
+        entry = self.documents.get(uid)
+        return entry[0] if entry else None
+
+    def update(self, documents: Iterable[Dict[str, Any]]) -> None:
+        """Add or refresh entries from Prismic API search results."""
+        for doc in documents:
+            published = doc.get('last_publication_date') or ''
+            self.documents[doc['uid']] = (doc['id'], published)
+            if published and (not self.last_publication_date or
+                              publication_timestamp(published) > publication_timestamp(self.last_publication_date)):
+                self.last_publication_date = published
+
+    def clear(self) -> None:
+        self.documents = {}
+        self.last_publication_date = None
+
+    def save(self) -> None:
+        """Write the index atomically, so an interrupted run never leaves a truncated file."""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'last_publication_date': self.last_publication_date,
+                'documents': self.documents,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def as_posts(self) -> List[Dict[str, Any]]:
+        """Return the index in the shape of Prismic search results."""
+        return [
+            {'uid': uid, 'id': doc_id, 'last_publication_date': published}
+            for uid, (doc_id, published) in self.documents.items()
+        ]
+
+
+def publication_timestamp(value: str) -> int:
+    """Convert a Prismic date such as '2024-11-28T10:00:00+0000' to milliseconds since the epoch."""
+    return int(datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').timestamp() * 1000)
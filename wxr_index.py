@@ -0,0 +1,293 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from wxr_reader import item_text
+
+# Bytes read at a time while scanning for items
+SCAN_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Everything the scanner has to recognize: the sections that may contain anything, and item boundaries
+ITEM_TOKEN = re.compile(rb'<!\[CDATA\[|<!--|<item[\s>]|</item\s*>')
+# Longest prefix of a token that could be cut off at the end of a chunk
+TOKEN_OVERLAP = 16
+
+NAMESPACE_DECLARATION = re.compile(rb'\sxmlns(?::[\w.-]+)?="[^"]*"')
+
+# Key fields stored per item, in column order
+INDEXED_FIELDS = ('post_id', 'post_type', 'status', 'post_name', 'modified_gmt', 'attachment_url')
+
+
+def index_path_for(xml_path: str) -> str:
+    """The sidecar index file of an export, e.g. `export.xml.index.sqlite3`."""
+    return f'{xml_path}.index.sqlite3'
+
+
+def scan_items(xml_path: str) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield the byte offset and raw bytes of every <item> in an export, without parsing XML.
+
+    CDATA sections and comments are skipped over, so post bodies mentioning
+    `<item>` don't throw the scan off. Only the item being scanned is held
+    in memory.
+    """
+    with open(xml_path, 'rb') as f:
+        buffer = b''
+        base = 0          # File offset of buffer[0]
+        pos = 0           # Where scanning resumes in buffer
+        item_start = None
+        closing = None    # End marker of the CDATA section or comment being skipped
+        eof = False
+
+        while True:
+            if closing is not None:
+                end = buffer.find(closing, pos)
+                if end != -1:
+                    pos = end + len(closing)
+                    closing = None
+                    continue
+                pos = max(pos, len(buffer) - len(closing) + 1)
+            else:
+                match = ITEM_TOKEN.search(buffer, pos)
+                if match:
+                    token = match.group()
+                    if token == b'<![CDATA[':
+                        closing = b']]>'
+                    elif token == b'<!--':
+                        closing = b'-->'
+                    elif token.startswith(b'</'):
+                        if item_start is not None:
+                            yield base + item_start, buffer[item_start:match.end()]
+                            item_start = None
+                    elif item_start is None:
+                        item_start = match.start()
+                    pos = match.end()
+                    continue
+                pos = max(pos, len(buffer) - TOKEN_OVERLAP)
+
+            if eof:
+                return
+
+            # Drop what was scanned, except an item still being read
+            keep = item_start if item_start is not None else pos
+            buffer = buffer[keep:]
+            base += keep
+            pos -= keep
+            if item_start is not None:
+                item_start = 0
+
+            chunk = f.read(SCAN_CHUNK_SIZE)
+            if chunk:
+                buffer += chunk
+            else:
+                eof = True
+
+
+def read_namespaces(xml_path: str) -> bytes:
+    """The namespace declarations of the export's <rss> element, needed to parse items on their own."""
+    with open(xml_path, 'rb') as f:
+        head = f.read(64 * 1024)
+    start = head.find(b'<rss')
+    end = head.find(b'>', start)
+    if start == -1 or end == -1:
+        return b''
+    return b''.join(NAMESPACE_DECLARATION.findall(head[start:end]))
+
+
+def parse_item_bytes(data: bytes, namespaces: bytes) -> etree._Element:
+    """Parse the raw bytes of one <item>, as returned by `scan_items` or `WxrIndex.read`."""
+    parser = etree.XMLParser(huge_tree=True, recover=True)
+    root = etree.fromstring(b'<rss' + namespaces + b'>' + data + b'</rss>', parser)
+    return root[0]
+
+
+class WxrIndex:
+    """
+    Sidecar index of a WordPress export: where each <item> starts and ends,
+    plus the fields runs usually select items by.
+
+    With it, items can be filtered without parsing the export and read back
+    individually with a single seek. The index records the export's size and
+    modification time and is rejected once the export changes.
+
+    :param xml_path: The WordPress export.
+    :param path: SQLite index file (default: next to the export).
+    """
+
+    def __init__(self, xml_path: str, path: str = None):
+        self.xml_path = xml_path
+        self.path = path or index_path_for(xml_path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                position INTEGER PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                post_id TEXT NOT NULL,
+                post_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                post_name TEXT NOT NULL,
+                modified_gmt TEXT NOT NULL,
+                attachment_url TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS items_type_status ON items (post_type, status);
+            CREATE INDEX IF NOT EXISTS items_post_id ON items (post_id);
+            CREATE INDEX IF NOT EXISTS items_post_name ON items (post_name);
+        ''')
+        self.conn.commit()
+        self.file = None
+        self._namespaces: bytes = None
+
+    def _meta(self, key: str) -> Any:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _signature(self) -> Tuple[int, int]:
+        stat = os.stat(self.xml_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_current(self) -> bool:
+        """Whether the index was built from the export as it is now."""
+        return (self._meta('size'), self._meta('mtime_ns')) == self._signature()
+
+    def build(self, batch_size: int = 1000) -> int:
+        """(Re)index the export in one streaming pass; returns the number of items."""
+        signature = self._signature()
+        namespaces = read_namespaces(self.xml_path)
+        with self.conn:
+            self.conn.execute('DELETE FROM items')
+            self.conn.execute('DELETE FROM meta')
+
+        rows: List[tuple] = []
+        position = 0
+        for offset, data in scan_items(self.xml_path):
+            item = parse_item_bytes(data, namespaces)
+            rows.append((position, offset, len(data)) + tuple(
+                item_text(item, f'wp:{field}') for field in INDEXED_FIELDS
+            ))
+            position += 1
+            if len(rows) >= batch_size:
+                self._insert(rows)
+                rows = []
+        self._insert(rows)
+
+        with self.conn:
+            self.conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+                ('size', signature[0]),
+                ('mtime_ns', signature[1]),
+                ('namespaces', namespaces.decode('utf-8')),
+                ('built', time.time()),
+            ])
+        self._namespaces = namespaces
+        return position
+
+    def _insert(self, rows: List[tuple]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                f'INSERT INTO items (position, offset, length, {", ".join(INDEXED_FIELDS)}) '
+                f'VALUES ({", ".join("?" * (3 + len(INDEXED_FIELDS)))})',
+                rows
+            )
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def select(self, post_types: Iterable[str] = (), statuses: Iterable[str] = (),
+               post_ids: Iterable[str] = (), post_names: Iterable[str] = (),
+               start: int = None, stop: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the index entries matching every filter given, in export order.
+
+        `start` and `stop` select item positions like a slice of all items.
+        """
+        clauses, params = [], []
+        for column, values in (('post_type', post_types), ('status', statuses),
+                               ('post_id', post_ids), ('post_name', post_names)):
+            values = list(values)
+            if values:
+                clauses.append(f'{column} IN ({", ".join("?" * len(values))})')
+                params.extend(values)
+        if start is not None:
+            clauses.append('position >= ?')
+            params.append(start)
+        if stop is not None:
+            clauses.append('position < ?')
+            params.append(stop)
+
+        where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+        cursor = self.conn.execute(
+            f'SELECT position, offset, length, {", ".join(INDEXED_FIELDS)} FROM items {where} ORDER BY position',
+            params
+        )
+        columns = [description[0] for description in cursor.description]
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+    def read(self, entry: Dict[str, Any]) -> etree._Element:
+        """Seek to an indexed item and parse just that one."""
+        if self.file is None:
+            self.file = open(self.xml_path, 'rb')
+        if self._namespaces is None:
+            self._namespaces = (self._meta('namespaces') or '').encode('utf-8')
+        self.file.seek(entry['offset'])
+        return parse_item_bytes(self.file.read(entry['length']), self._namespaces)
+
+    def iter_items(self, **filters: Any) -> Iterator[etree._Element]:
+        """Parse the items matching `filters` (see `select`), one at a time."""
+        for entry in self.select(**filters):
+            yield self.read(entry)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.conn.close()
+
+
+def open_index(xml_path: str, path: str = None) -> Optional[WxrIndex]:
+    """The export's index if one was built and is still current, otherwise None."""
+    path = path or index_path_for(xml_path)
+    if not os.path.exists(path):
+        return None
+    index = WxrIndex(xml_path, path)
+    if not index.is_current():
+        print(f"Ignoring stale index {path}; rebuild it with: python wxr_index.py {xml_path}")
+        index.close()
+        return None
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Index a WordPress export for random access, or query an existing index.')
+    parser.add_argument('xml_path', help='WordPress export XML file')
+    parser.add_argument('--index', help='Index file (default: <xml_path>.index.sqlite3)')
+    parser.add_argument('--rebuild', action='store_true', help='Reindex even if the index is current')
+    parser.add_argument('--type', action='append', default=[], help='List items of this post type (repeatable)')
+    parser.add_argument('--status', action='append', default=[], help='List items with this status (repeatable)')
+    parser.add_argument('--post-id', action='append', default=[], help='List the item with this wp:post_id (repeatable)')
+    parser.add_argument('--name', action='append', default=[], help='List the item with this wp:post_name (repeatable)')
+    parser.add_argument('--show', action='store_true', help='Print the XML of every selected item')
+    args = parser.parse_args()
+
+    index = WxrIndex(args.xml_path, args.index)
+    if args.rebuild or not index.is_current():
+        start = time.perf_counter()
+        count = index.build()
+        print(f"Indexed {count} items of {args.xml_path} in {time.perf_counter() - start:.1f} s into {index.path}")
+
+    if args.type or args.status or args.post_id or args.name:
+        for entry in index.select(args.type, args.status, args.post_id, args.name):
+            print(f"{entry['position']:>7} {entry['post_id']:>8} {entry['post_type']:<12} {entry['status']:<10} "
+                  f"{entry['modified_gmt']:<20} {entry['post_name']}")
+            if args.show:
+                print(etree.tostring(index.read(entry), encoding='unicode'))
+    index.close()